@@ -6,11 +6,13 @@ import os
 
 SRC = """
 from typing import TYPE_CHECKING
+from itertools import chain
 import random
 
 if TYPE_CHECKING:
     from solver.model.connection import ConnectionState
     from solver.model.network import Network, NetworkTopo, FreezedNetwork, Device
+    from solver.model.fabric import Fabric
     from solver.model.pod import Pod, PodConfig, PodContainer
     from solver.model.solution import Solution, Batch
     from solver.generator import RandomConnectionStateGenerator, ProbabilityConnectionStateGenerator
@@ -32,35 +34,17 @@ pods.configs["cslb"] = PodConfig(1)
 pods.connect("sm2", "csdb", "sbim", "nsim")
 pods.connect("cslb", "sbim", "nsim")
 
-topo = NetworkTopo()
-eor = [Device(f"eor-{i}", 2*50) for i in range(2)]
-tor = [Device(f"tor-{i}", 2*2+2) for i in range(50)]
-host = [Device(f"host-{i}", 2) for i in range(50)]
-topo.device(*(eor+tor+host))
-for i in range(2):
-    for j in range(50):
-        for k in range(2):
-            topo.cable((eor[i], j*2+k), (tor[j], i*2+k))
-for i in range(0, 50, 2):
-    t0, t1 = tor[i:i+2]
-    h0, h1 = host[i:i+2]
-    topo.cable((t0, 0), (h0, 0))
-    topo.cable((t0, 1), (h1, 0))
-    topo.cable((t1, 0), (h0, 1))
-    topo.cable((t1, 1), (h1, 1))
-
-net = Network(topo, pods)
-for pod in pods.values():
-    net.bind(pod, random.choice(host))
+fabric = Fabric(eors=2, tors=50, hostsPerGroup=2, homing=2, uplinks=2, downlinkPort=0)
+net = fabric.network(pods)
 frenet = net.freeze()
 
 ppod = [p.id for p in pods.values()]
-phost = [p.id for p in host]
-phostPort = sum((p.inames() for p in host), start=[])
-ptor = [p.id for p in tor]
-ptorPort = sum((p.inames() for p in tor), start=[])
-peor = [p.id for p in eor]
-peorPort = sum((p.inames() for p in eor), start=[])
+phost = [p.id for p in fabric.host]
+phostPort = list(chain.from_iterable(p.inames() for p in fabric.host))
+ptor = [p.id for p in fabric.tor]
+ptorPort = list(chain.from_iterable(p.inames() for p in fabric.tor))
+peor = [p.id for p in fabric.eor]
+peorPort = list(chain.from_iterable(p.inames() for p in fabric.eor))
 pall = net.ports()
 
 FAIL_COUNT = {FAIL_COUNT}
@@ -1,8 +1,6 @@
-import subprocess
 import sys
-import time
 from pathlib import Path
-from rich import print
+from .model.summary import print
 import json
 
 import click
@@ -28,18 +26,10 @@ class AliasedGroup(click.Group):
         return cmd.name, cmd, args
 
 
-def execute(module: str, *args: str):
+def parseStats(stats: str):
     from .model import ExecutionStatus
 
     status = ExecutionStatus()
-
-    result = subprocess.run(["/usr/bin/time", "-v", "python", "-m", module, *args],
-                            capture_output=True, text=True, encoding="utf-8", timeout=600)
-    output = result.stdout.strip()
-    stats = result.stderr.strip()
-    if result.returncode != 0:
-        print(stats)
-        result.check_returncode()
     for line in stats.splitlines():
         line = line.strip()
         if line.startswith("User time (seconds):"):
@@ -56,7 +46,52 @@ def execute(module: str, *args: str):
             status.wallClock = minute * 60 + second
         if line.startswith("Maximum resident set size (kbytes):"):
             status.maxResidentSize = int(line.split(':')[1])
-    return output, status
+    return status
+
+
+def execute(module: str, *args: str, timeout: float = 600):
+    import subprocess
+    result = subprocess.run(["/usr/bin/time", "-v", "python", "-m", module, *args],
+                            capture_output=True, text=True, encoding="utf-8", timeout=timeout)
+    output = result.stdout.strip()
+    stats = result.stderr.strip()
+    if result.returncode != 0:
+        print(stats)
+        result.check_returncode()
+    return output, parseStats(stats)
+
+
+def executeStream(module: str, *args: str, timeout: float = 600):
+    # run the module in JSON Lines mode and relay its records to stdout as they arrive,
+    # filling the measured status into the final record once the process has exited
+    import subprocess
+    import tempfile
+    import threading
+    from .model import stream
+
+    command = ["/usr/bin/time", "-v", "python", "-m", module, *args, "--jsonl"]
+    expired = threading.Event()
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as stderr:
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr, text=True, encoding="utf-8")
+        timer = threading.Timer(timeout, lambda: (expired.set(), proc.kill()))
+        timer.start()
+
+        def measure(inner):
+            proc.wait()
+            stderr.seek(0)
+            return parseStats(stderr.read()).measured(inner)
+
+        try:
+            stream.relay(stream.read(proc.stdout), measure)
+            proc.wait()
+        finally:
+            timer.cancel()
+        if expired.is_set():
+            raise subprocess.TimeoutExpired(command, timeout)
+        if proc.returncode != 0:
+            stderr.seek(0)
+            print(stderr.read().strip())
+            raise subprocess.CalledProcessError(proc.returncode, command)
 
 
 @click.group(cls=AliasedGroup)
@@ -67,42 +102,272 @@ def main(ctx=None):
 
 @main.command()
 @click.argument("file", type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True, path_type=Path))
-def generate(file: Path):
-    output, status = execute("solver.generator", str(file))
+@click.option("--seed", default=None, type=int, help="Seed the random generators of the script.")
+@click.option("--jsonl", is_flag=True, help="Stream the state as JSON Lines records.")
+def generate(file: Path, seed: int | None, jsonl: bool):
+    args = [str(file)] if seed is None else [str(file), "--seed", str(seed)]
+    if jsonl:
+        executeStream("solver.generator", *args)
+        return
+    output, status = execute("solver.generator", *args)
     from .model.connection import ConnectionState
     data = ConnectionState()
     data.load(json.loads(output))
-    data.status = status
-    print(json.dumps(data.dump()))
+    data.status = status.measured(data.status)
+    click.echo(json.dumps(data.dump()))
 
 
 @main.command()
 @click.argument("file", type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True, path_type=Path))
-def solve(file: Path):
-    output, status = execute("solver.solver", str(file))
+@click.option("--time-limit", default=None, type=float, help="Time limit in seconds for each SCIP solve.")
+@click.option("--gap", default=None, type=float, help="Relative MIP gap to stop each SCIP solve at.")
+@click.option("--deadline", default=None, type=float, help="Time budget in seconds for the whole batch search.")
+@click.option("--workers", default=1, type=int, help="Solve upcoming batch-search steps in parallel.")
+@click.option("--partition", default="greedy", type=click.Choice(["greedy", "balanced", "exact"]),
+              help="Split the selected pods type by type (greedy), or opt in to balanced or exact batches.")
+@click.option("--presolve/--no-presolve", default=False, help="Reduce the model before each SCIP solve (opt-in).")
+@click.option("--jsonl", is_flag=True, help="Stream the solution as JSON Lines records.")
+def solve(file: Path, time_limit: float | None, gap: float | None, deadline: float | None, workers: int, partition: str,
+          presolve: bool, jsonl: bool):
+    args = [str(file), "--workers", str(workers), "--partition", partition,
+            "--presolve" if presolve else "--no-presolve"]
+    if time_limit is not None:
+        args += ["--time-limit", str(time_limit)]
+    if gap is not None:
+        args += ["--gap", str(gap)]
+    if deadline is not None:
+        args += ["--deadline", str(deadline)]
+    # leave the process room to finish the step that crosses the deadline and report it
+    timeout = 600 if deadline is None else max(600, 2 * deadline + 60)
+    if jsonl:
+        executeStream("solver.solver", *args, timeout=timeout)
+        return
+    output, status = execute("solver.solver", *args, timeout=timeout)
     from .model.solution import Solution
     data = Solution()
     data.load(json.loads(output))
-    data.status = status
-    print(json.dumps(data.dump()))
+    data.status = status.measured(data.status)
+    click.echo(json.dumps(data.dump()))
+
+
+# documents up to this many pods, or JSON Lines files up to this size, are shown in full unless asked otherwise
+FULL_PODS = 200
+FULL_BYTES = 64 * 1024
+
+
+def show(file: Path, load, full: bool | None, top: int, pager: bool):
+    if pager:
+        # the views write plain text to stdout, which is collected and handed to the pager
+        import io
+        import pydoc
+        from contextlib import redirect_stdout
+        with redirect_stdout(io.StringIO()) as buffer:
+            show(file, load, full, top, False)
+        pydoc.pager(buffer.getvalue())
+        return
+    if file.suffix == ".jsonl":
+        from .model import stream
+        if full is None:
+            full = file.stat().st_size <= FULL_BYTES
+        with file.open() as f:
+            stream.display(stream.read(f), full, top)
+        return
+    data = load(json.loads(file.read_text()))
+    if full is None:
+        full = len(getattr(data, "state", data).pods) <= FULL_PODS
+    if full:
+        data.display()
+    else:
+        data.summary(top)
+
+
+def viewer(command):
+    command = click.option("--pager", is_flag=True, help="Page the output.")(command)
+    command = click.option("--top", default=10, type=int, help="Rows of the ranked summary tables.")(command)
+    command = click.option("--full/--summary", default=None,
+                           help="Print every pod and connection, or per-type tables. Large files default to the summary.")(command)
+    return command
 
 
 @main.command()
 @click.argument("file", type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True, path_type=Path))
-def state(file: Path):
+@viewer
+def state(file: Path, full: bool | None, top: int, pager: bool):
+    def load(raw):
+        from .model.connection import ConnectionState
+        data = ConnectionState()
+        data.load(raw)
+        return data
+    show(file, load, full, top, pager)
+
+
+@main.command()
+@click.argument("file", type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True, path_type=Path))
+@viewer
+def solution(file: Path, full: bool | None, top: int, pager: bool):
+    def load(raw):
+        from .model.solution import Solution
+        data = Solution()
+        data.load(raw)
+        return data
+    show(file, load, full, top, pager)
+
+
+@main.command()
+@click.argument("file", type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True, path_type=Path))
+@click.argument("output", type=click.Path(dir_okay=False, path_type=Path))
+@click.option("--c1", default=1000.0, type=float, help="Weight of covered connections, written into .mps/.lp.")
+@click.option("--c3", default=10.0, type=float, help="Penalty of selected majors, written into .mps/.lp.")
+@click.option("--c4", default=1.0, type=float, help="Penalty of selected pods, written into .mps/.lp.")
+def export(file: Path, output: Path, c1: float, c3: float, c4: float):
     from .model.connection import ConnectionState
+    from .algorithms.cip import CIPInstance
     data = ConnectionState()
     data.load(json.loads(file.read_text()))
-    data.display()
+    instance = CIPInstance.fromState(data)
+    instance.write(output, c1, c3, c4)
+    print(f"Write {len(instance.ids)} pods, {len(instance.edges)} edges, {len(instance.types)} types to {output}")
 
 
 @main.command()
 @click.argument("file", type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True, path_type=Path))
-def solution(file: Path):
-    from .model.solution import Solution
-    data = Solution()
+@click.option("--c1", default=1000.0, type=float, help="Weight of covered connections.")
+@click.option("--c3", default=10.0, type=float, help="Penalty of selected majors.")
+@click.option("--c4", default=1.0, type=float, help="Penalty of selected pods.")
+@click.option("--time-limit", default=None, type=float)
+@click.option("--gap", default=None, type=float)
+def instance(file: Path, c1: float, c3: float, c4: float, time_limit: float | None, gap: float | None):
+    from .algorithms.cip import CIPInstance, CIPSolver
+    cip = CIPSolver.fromInstance(CIPInstance.load(file)).compile(c1, c3, c4)
+    ids = cip.solveIds(time_limit, gap)
+    click.echo(json.dumps({"pods": ids, "optimal": cip.optimal, "gap": cip.gap, "bound": cip.bound}))
+
+
+@main.command()
+@click.argument("file", type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True, path_type=Path))
+@click.option("--c1", "c1s", multiple=True, default=[1000.0], type=float, help="Weight of covered connections.")
+@click.option("--c3", "c3s", multiple=True, default=[10.0], type=float, help="Penalty of selected majors.")
+@click.option("--c4", "c4s", multiple=True, default=[1.0], type=float, help="Penalty of selected pods.")
+@click.option("--time-limit", default=None, type=float)
+@click.option("--gap", default=None, type=float)
+@click.option("--partition", default="greedy", type=click.Choice(["greedy", "balanced", "exact"]),
+              help="Split the selected pods type by type (greedy), or opt in to balanced or exact batches.")
+@click.option("--output", default=None, type=click.Path(dir_okay=False, path_type=Path))
+def sweep(file: Path, c1s: list[float], c3s: list[float], c4s: list[float], time_limit: float | None,
+          gap: float | None, partition: str, output: Path | None):
+    from itertools import product
+    from .model.connection import ConnectionState
+    from .solver import CIPWeightSweep
+    data = ConnectionState()
     data.load(json.loads(file.read_text()))
-    data.display()
+    points = CIPWeightSweep(list(product(c1s, c3s, c4s)), time_limit, gap, partition).solve(data)
+    print(f"{'C1':>10} {'C3':>10} {'C4':>10} {'covered':>8} {'batches':>8} {'majors':>8} {'pods':>8}")
+    for point in points:
+        line = (f"{point.C1:>10g} {point.C3:>10g} {point.C4:>10g} {point.covered:>8} {len(point.batches):>8} "
+                f"{point.majors:>8} {point.pods:>8}" + ("" if point.optimal else " (limit)"))
+        print(f"[bold]{line}[/bold]" if point.pareto else line)
+    print(f"{sum(point.pareto for point in points)} / {len(points)} settings on the frontier (bold)")
+    if output is not None:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps([point.dump() for point in points], indent=2))
+        print(f"Write results to {output}")
+
+
+@main.command()
+@click.option("--tier", "tiers", multiple=True, default=["small", "medium"], type=click.Choice(["small", "medium", "large"]))
+@click.option("--seed", default=0, type=int)
+@click.option("--solve/--no-solve", default=True)
+@click.option("--path-budget", default=None, type=int, help="Bound the shortest path tables to this many MB.")
+@click.option("--output", default=Path("./logs/bench/result.json"), type=click.Path(dir_okay=False, path_type=Path))
+@click.option("--compare", "base", default=None, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--budgets/--no-budgets", default=True, help="Fail when a module imports slower than its budget.")
+def bench(tiers: list[str], seed: int, solve: bool, path_budget: int | None, output: Path, base: Path | None,
+          budgets: bool):
+    from .bench import run, display, compare, overBudget
+    data, results = run(list(tiers), seed, solve, None if path_budget is None else path_budget << 20)
+    display(results, data["imports"])
+    if base is not None:
+        compare(json.loads(base.read_text()), data)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(data, indent=2))
+    print(f"Write results to {output}")
+    over = overBudget(data["imports"])
+    if budgets and over:
+        raise click.ClickException("; ".join(f"importing {module} takes {value:.1f} ms, over its {budget} ms budget"
+                                             for module, (value, budget) in over.items()))
+
+
+@main.group(cls=AliasedGroup)
+def queue():
+    pass
+
+
+@queue.command("enqueue")
+@click.argument("db", type=click.Path(dir_okay=False, path_type=Path))
+@click.argument("names", nargs=-1, required=True)
+@click.option("--limit", default=10, type=int, help="Jobs of each scenario.")
+@click.option("--seed", default=None, type=int, help="Seed job i of a scenario with SEED + i.")
+def queueEnqueue(db: Path, names: list[str], limit: int, seed: int | None):
+    from .queue import JobQueue
+    jobs = JobQueue(db)
+    jobs.init()
+    for name in names:
+        print(f"Enqueue {jobs.enqueue(name, limit, seed)} jobs of {name}")
+
+
+@queue.command("work")
+@click.argument("db", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--jobs", default=None, type=int, help="Jobs run at once by this worker.")
+@click.option("--lease", default=120, type=float, help="Seconds a claim lasts without a heartbeat.")
+@click.option("--attempts", default=3, type=int, help="Claims of a job before it is failed.")
+@click.option("--root", default=Path("./logs"), type=click.Path(file_okay=False, path_type=Path))
+def queueWork(db: Path, jobs: int | None, lease: float, attempts: int, root: Path):
+    import asyncio
+    from .pipeline import Pipeline
+    from .queue import JobQueue, Worker
+    pipeline = Pipeline(root=root)
+    if jobs is not None:
+        pipeline.concurrency = jobs
+    asyncio.run(Worker(JobQueue(db, lease, attempts), pipeline).run())
+
+
+@queue.command("status")
+@click.argument("db", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+def queueStatus(db: Path):
+    from .queue import JobQueue
+    for name, counts in sorted(JobQueue(db).counts().items()):
+        print(f"{name}: " + ", ".join(f"{k} {v}" for k, v in sorted(counts.items())))
+
+
+@queue.command("retry")
+@click.argument("db", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.argument("name", required=False)
+def queueRetry(db: Path, name: str | None):
+    from .queue import JobQueue
+    JobQueue(db).reset(name)
+
+
+@queue.command("collect")
+@click.argument("db", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--root", default=Path("./logs"), type=click.Path(file_okay=False, path_type=Path))
+def queueCollect(db: Path, root: Path):
+    from .queue import JobQueue, collect
+    collect(JobQueue(db), root)
+
+
+@main.command()
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=8000, type=int)
+@click.option("--socket", default=None, type=click.Path(dir_okay=False), help="Listen on a unix socket instead of TCP.")
+@click.option("--workers", default=None, type=int)
+@click.option("--max-queue", default=64, type=int)
+def serve(host: str, port: int, socket: str | None, workers: int | None, max_queue: int):
+    from .server import SolveService, serve as run
+    service = SolveService(maxQueue=max_queue)
+    if workers is not None:
+        service.workers = workers
+    print(f"Serve on {socket or f'{host}:{port}'} with {service.workers} workers")
+    run(service, host, port, socket)
 
 
 if __name__ == "__main__":
@@ -1,65 +1,220 @@
+import os
+import tempfile
 from dataclasses import dataclass, field
+from pathlib import Path
+import numpy as np
 import pyomo.environ as pyo
+from pyomo.solvers.plugins.solvers.SCIPAMPL import SCIPAMPL
 from ..model.pod import Pod
 from ..model.connection import ConnectionState
+from ..profiling import phase, count, peak
+
+
+def runScip(model: pyo.ConcreteModel, timeLimit: float | None = None, gap: float | None = None):
+    # solve and load the best incumbent into the model;
+    # returns whether one was found, whether it is optimal, the relative gap and the dual bound
+    opt = pyo.SolverFactory('scip')
+    if timeLimit is not None:
+        opt.options["limits/time"] = max(timeLimit, 0.0)
+    if gap is not None:
+        opt.options["limits/gap"] = gap
+    fd, logfile = tempfile.mkstemp(suffix="_scip.log")
+    os.close(fd)
+    try:
+        with phase("solve"):
+            results = opt.solve(model, logfile=logfile, load_solutions=False)
+        log = SCIPAMPL.read_scip_log(logfile)
+    finally:
+        os.remove(logfile)
+    count("scip.solves")
+    count("scip.nodes", log.get("solving_nodes", 0))
+
+    optimal = results.solver.termination_condition == pyo.TerminationCondition.optimal
+    gap = 0.0 if optimal else log.get("gap", float("inf")) / 100
+    if len(results.solution) == 0:
+        return False, optimal, gap, log.get("dual_bound")
+    model.solutions.load_from(results)
+    return True, optimal, gap, log.get("dual_bound")
 
 
 @dataclass
-class CIPSolver:
-    state: ConnectionState
-    id2int: dict[str, int] = field(default_factory=dict, init=False)
-    int2id: dict[int, str] = field(default_factory=dict, init=False)
-    PR: list[tuple[list[int], int]] = field(default_factory=list, init=False)
-    M: list[int] = field(default_factory=list, init=False)
-    E: list[tuple[int, int]] = field(default_factory=list, init=False)
-    model: pyo.ConcreteModel | None = field(default=None, init=False)
+class CIPInstance:
+    # variable i is pod ids[i]; types[k] owns variables typeIndices[typeIndptr[k]:typeIndptr[k+1]]
+    ids: list[str] = field(default_factory=list)
+    edges: np.ndarray = field(default_factory=lambda: np.zeros((0, 2), dtype=np.int32))
+    types: list[str] = field(default_factory=list)
+    typeIndptr: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64))
+    typeIndices: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32))
+    # -1 for types without a redundancy limit
+    redundancy: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    major: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
 
-    def __post_init__(self):
-        self.pods = self.state.pods
-        id2int = {}
-        for k in self.state.pods:
-            id2int[k] = len(id2int)
-        PR = [([id2int[p.id] for p in self.state.pods.types[k]], self.state.pods.configs[k].redundancy)
-              for k in self.state.pods.types]
-        M = sum([[id2int[p.id] for p in self.state.pods.types[k]]
-                for k, c in self.state.pods.configs.items() if c.major], start=[])
-        E = list(set((id2int[x], id2int[y])
-                 for x, l in self.state.items() for y in l))
-        self.id2int = id2int
-        self.int2id = {v: k for k, v in id2int.items()}
-        self.PR = PR
-        self.M = M
-        self.E = E
-
-    def compile(self, C1=100.0, C3=10.0, C4=1.0):
-        n = sum(len(l) for l, _ in self.PR)
+    @classmethod
+    def fromState(cls, state: ConnectionState):
+        pods = state.pods
+        id2int = {k: i for i, k in enumerate(pods)}
+        types = pods.types
+        names = list(types.keys())
+        typeIndptr = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum([len(types[k]) for k in names], out=typeIndptr[1:])
+        typeIndices = np.fromiter((id2int[p.id] for k in names for p in types[k]),
+                                  dtype=np.int32, count=int(typeIndptr[-1]))
+        redundancy = np.array([-1 if pods.configs[k].redundancy is None else pods.configs[k].redundancy
+                               for k in names], dtype=np.int64)
+        majorTypes = pods.majorTypes
+        major = np.zeros(len(id2int), dtype=bool)
+        for i, k in enumerate(names):
+            if k in majorTypes:
+                major[typeIndices[typeIndptr[i]:typeIndptr[i + 1]]] = True
+        store = state.edges
+        remap = np.array([id2int[id] for id in store.ids], dtype=np.int32)
+        sources, targets = store.arrays()
+        edges = np.stack([remap[sources], remap[targets]], axis=1).reshape(-1, 2)
+        return cls(list(id2int.keys()), edges, names, typeIndptr, typeIndices, redundancy, major)
 
-        model = pyo.ConcreteModel()
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["ids"].tolist(), data["edges"], data["types"].tolist(), data["typeIndptr"],
+                       data["typeIndices"], data["redundancy"], data["major"])
+
+    def save(self, path: Path):
+        with open(path, "wb") as f:
+            np.savez_compressed(f, ids=np.array(self.ids, dtype=str), edges=self.edges,
+                                types=np.array(self.types, dtype=str), typeIndptr=self.typeIndptr,
+                                typeIndices=self.typeIndices, redundancy=self.redundancy, major=self.major)
 
-        # model.x = pyo.Var([1,2], domain=pyo.NonNegativeReals)
-        # model.OBJ = pyo.Objective(expr = 2*model.x[1] + 3*model.x[2])
-        # model.Constraint1 = pyo.Constraint(expr = 3*model.x[1] + 4*model.x[2] >= 1)
+    def groups(self):
+        indptr, indices = self.typeIndptr.tolist(), self.typeIndices.tolist()
+        return [(indices[indptr[k]:indptr[k + 1]], r) for k, r in enumerate(self.redundancy.tolist())]
 
+    def toModel(self, C1=100.0, C3=10.0, C4=1.0, linear=False, mutable=False):
+        # linear=True replaces each covered-edge product with a bounded variable y <= x_i + x_j,
+        # which is exact when maximizing and can be written as MPS;
+        # mutable=True keeps the weights and redundancies as parameters that can change between solves
+        n = len(self.ids)
+        E = [tuple(e) for e in self.edges.tolist()]
+        M = np.flatnonzero(self.major).tolist()
+
+        model = pyo.ConcreteModel()
+        if mutable:
+            model.C1 = pyo.Param(mutable=True, initialize=C1)
+            model.C3 = pyo.Param(mutable=True, initialize=C3)
+            model.C4 = pyo.Param(mutable=True, initialize=C4)
+            model.R = pyo.Param(list(range(len(self.types))), mutable=True,
+                                initialize=lambda _, k: max(int(self.redundancy[k]), 0))
+            C1, C3, C4 = model.C1, model.C3, model.C4
         model.x = pyo.Var(list(range(n)), domain=pyo.Binary)
-        model.OBJ = pyo.Objective(expr=C1 * sum((1 - (1 - model.x[i]) * (1 - model.x[j])) for i, j in self.E)
-                                  - C3 * sum(model.x[i] for i in self.M)
+        if linear:
+            model.y = pyo.Var(list(range(len(E))), bounds=(0, 1))
+            covered = sum(model.y[e] for e in range(len(E)))
+        else:
+            covered = sum((1 - (1 - model.x[i]) * (1 - model.x[j])) for i, j in E)
+        model.OBJ = pyo.Objective(expr=C1 * covered
+                                  - C3 * sum(model.x[i] for i in M)
                                   - C4 * sum(model.x[i] for i in range(n)), sense=pyo.maximize)
         model.cons = pyo.ConstraintList()
-        for l, r in self.PR:
+        if linear:
+            for e, (i, j) in enumerate(E):
+                model.cons.add(model.y[e] <= model.x[i] + model.x[j])
+        for k, (l, r) in enumerate(self.groups()):
+            if r < 0 or not l:
+                continue
             s = 0
             for i in l:
                 s = s + model.x[i]
-            model.cons.add(s <= r)
-        self.model = model
+            model.cons.add(s <= (model.R[k] if mutable else r))
+        return model
+
+    def write(self, path: Path, C1=100.0, C3=10.0, C4=1.0):
+        # .npz keeps the arrays; .mps and .lp write the linearized model for external solvers
+        path = Path(path)
+        if path.suffix == ".npz":
+            self.save(path)
+        else:
+            assert path.suffix in (".mps", ".lp"), f"Unknown instance format '{path.suffix}'."
+            self.toModel(C1, C3, C4, linear=True).write(str(path), io_options={"symbolic_solver_labels": True})
+
+
+@dataclass
+class CIPSolver:
+    state: ConnectionState
+    instance: CIPInstance = field(default_factory=CIPInstance, init=False)
+    model: pyo.ConcreteModel | None = field(default=None, init=False)
+    presolved: "Presolve | None" = field(default=None, init=False)
+    # outcome of the last solve: proven optimal, relative gap, and dual bound of the objective
+    optimal: bool = field(default=False, init=False)
+    gap: float = field(default=0.0, init=False)
+    bound: float | None = field(default=None, init=False)
+
+    def __post_init__(self):
+        self.pods = self.state.pods
+        self.instance = CIPInstance.fromState(self.state)
+
+    @classmethod
+    def fromInstance(cls, instance: CIPInstance, state: ConnectionState | None = None):
+        # solve a prebuilt (e.g. cached) instance without walking the pods and pairs again;
+        # without a state only solveIds is available
+        result = cls.__new__(cls)
+        result.state = state
+        result.pods = None if state is None else state.pods
+        result.instance = instance
+        result.model = None
+        result.presolved = None
+        result.optimal, result.gap, result.bound = False, 0.0, None
+        return result
+
+    def compile(self, C1=100.0, C3=10.0, C4=1.0, linear=False, presolve=False, mutable=False):
+        # presolve solves the aggregated integer model instead, which has no linear form and depends on the weights
+        assert not (linear and presolve), "Presolved models cannot be linearized."
+        assert not (mutable and presolve), "Presolved models cannot be reweighted."
+        with phase("compile"):
+            if presolve:
+                from .presolve import Presolve
+                with phase("presolve"):
+                    self.presolved = Presolve(self.instance, C1, C3, C4)
+                # a barely reduced model is not worth trading binaries for general integers
+                if len(self.presolved.sizes) > 0.9 * len(self.instance.ids):
+                    self.presolved = None
+            else:
+                self.presolved = None
+            if self.presolved is not None:
+                self.model = self.presolved.toModel()
+            else:
+                self.model = self.instance.toModel(C1, C3, C4, linear, mutable)
+        peak("model.vars", len(self.instance.ids))
+        peak("model.edges", len(self.instance.edges))
+        peak("model.constraints", self.model.nconstraints())
+        return self
+
+    def reweight(self, C1: float | None = None, C3: float | None = None, C4: float | None = None,
+                 scale: int | None = None):
+        # update a mutable model in place; scale multiplies every redundancy, like scaleRedundancy;
+        # the values of the last solve stay on the variables and are passed to SCIP as its start
+        assert self.model is not None and hasattr(self.model, "R"), "The model is not mutable."
+        for name, value in (("C1", C1), ("C3", C3), ("C4", C4)):
+            if value is not None:
+                getattr(self.model, name).set_value(value)
+        if scale is not None:
+            for k, r in enumerate(self.instance.redundancy.tolist()):
+                self.model.R[k].set_value(max(r, 0) * scale)
         return self
 
-    def solve(self) -> list[Pod]:
+    def solveIds(self, timeLimit: float | None = None, gap: float | None = None) -> list[str]:
+        # with limits, return the best incumbent found so far (empty if SCIP found none)
         assert self.model is not None
 
-        opt = pyo.SolverFactory('scip')
-        opt.solve(self.model)
+        loaded, self.optimal, self.gap, self.bound = runScip(self.model, timeLimit, gap)
+        if not loaded:
+            return []
 
-        selectInts = [i for i in range(len(self.id2int)) if abs(pyo.value(self.model.x[i]) - 1.0) < 0.1]
-        selectPods = [self.pods[self.int2id[i]] for i in selectInts]
+        ids = self.instance.ids
+        if self.presolved is not None:
+            values = [pyo.value(self.model.z[a], exception=False) or 0.0 for a in self.model.z]
+            return [ids[i] for i in sorted(self.presolved.expand(values))]
+        return [ids[i] for i in range(len(ids))
+                if abs((pyo.value(self.model.x[i], exception=False) or 0.0) - 1.0) < 0.1]
 
-        return selectPods
\ No newline at end of file
+    def solve(self, timeLimit: float | None = None, gap: float | None = None) -> list[Pod]:
+        assert self.pods is not None, "Solving pods requires the connection state."
+        return [self.pods[id] for id in self.solveIds(timeLimit, gap)]
@@ -0,0 +1,59 @@
+from dataclasses import dataclass, field
+from typing import Iterable
+import numpy as np
+from ..model.connection import ConnectionState, PairIndex
+from ..model.pod import Pod
+
+
+@dataclass
+class CoverageEvaluator:
+    # scores many candidate batches or solutions of one state at once on boolean pod masks
+    state: ConnectionState
+    # rows of pod masks processed together, bounding the rows x pairs temporaries
+    chunk: int = 1 << 22
+    index: PairIndex = field(init=False)
+    major: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self.index = self.state.index
+        majors = self.state.pods.majorTypes
+        pods = self.state.pods
+        self.major = np.array([(pods[id].name if id in pods else Pod.fromId(id).name) in majors
+                               for id in self.index.ids], dtype=bool)
+
+    def masks(self, batches: list[Iterable[Pod | str]]) -> np.ndarray:
+        id2int = self.index.id2int
+        rows, cols = [], []
+        for row, batch in enumerate(batches):
+            for pod in batch:
+                id = pod if isinstance(pod, str) else pod.id
+                assert id in id2int, f"Pod '{id}' not found"
+                rows.append(row)
+                cols.append(id2int[id])
+        result = np.zeros((len(batches), len(id2int)), dtype=bool)
+        result[rows, cols] = True
+        return result
+
+    def covered(self, masks: np.ndarray) -> np.ndarray:
+        # the number of weak connections with an end selected, for every row
+        sources, targets = self.index.edges[:, 0], self.index.edges[:, 1]
+        step = max(1, self.chunk // max(1, len(sources)))
+        result = np.zeros(len(masks), dtype=np.int64)
+        for start in range(0, len(masks), step):
+            part = masks[start:start + step]
+            result[start:start + step] = np.count_nonzero(part[:, sources] | part[:, targets], axis=1)
+        return result
+
+    def majors(self, masks: np.ndarray) -> np.ndarray:
+        return np.count_nonzero(masks & self.major, axis=1)
+
+    def batches(self, batches: list[Iterable[Pod | str]]) -> np.ndarray:
+        # (covered connections, majors, pods) of every batch
+        masks = self.masks(batches)
+        return np.stack([self.covered(masks), self.majors(masks), np.count_nonzero(masks, axis=1)], axis=1)
+
+    def solutions(self, solutions: list[list[Iterable[Pod | str]]]) -> np.ndarray:
+        # Solution.evaluated of every candidate: (covered connections, batches, majors, pods)
+        unions = self.masks([[pod for batch in solution for pod in batch] for solution in solutions])
+        counts = np.array([len(solution) for solution in solutions], dtype=np.int64)
+        return np.stack([self.covered(unions), counts, self.majors(unions), np.count_nonzero(unions, axis=1)], axis=1)
@@ -0,0 +1,113 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from ..model.connection import ConnectionState
+from ..model.pod import Pod
+from ..model.solution import Batch
+from .evaluate import CoverageEvaluator
+
+
+@dataclass
+class BatchPartitioner:
+    state: ConnectionState
+    neighbors: dict[str, list[str]] = field(default_factory=dict, init=False)
+
+    def __post_init__(self):
+        neighbors: dict[str, list[str]] = defaultdict(list)
+        for source, target in self.state.index.pairs:
+            neighbors[source].append(target)
+            neighbors[target].append(source)
+        self.neighbors = neighbors
+
+    def capacity(self, name: str, batchCount: int):
+        redundancy = self.state.pods.configs[name].redundancy
+        return batchCount if redundancy is None else redundancy
+
+    def balanced(self, pods: list[Pod], batchCount: int) -> list[Batch]:
+        # place the heaviest pods first into the least loaded batch that still has room for their type;
+        # majors are spread by major count first, other pods by covered connections first
+        majors = self.state.pods.majorTypes
+        order = sorted(pods, key=lambda p: (p.name not in majors, -len(self.neighbors.get(p.id, ()))))
+        batches = [Batch() for _ in range(batchCount)]
+        members: list[set[str]] = [set() for _ in range(batchCount)]
+        loads = [0] * batchCount
+        majorCounts = [0] * batchCount
+        typeCounts: dict[str, list[int]] = defaultdict(lambda: [0] * batchCount)
+
+        for pod in order:
+            counts = typeCounts[pod.name]
+            limit = self.capacity(pod.name, batchCount)
+            isMajor = pod.name in majors
+            edges = self.neighbors.get(pod.id, ())
+            best, bestKey = -1, None
+            for b in range(batchCount):
+                if counts[b] >= limit:
+                    continue
+                # connections already covered by a neighbor in the same batch are not counted twice
+                load = loads[b] + sum(1 for other in edges if other not in members[b])
+                key = (majorCounts[b], load) if isMajor else (load, majorCounts[b])
+                if bestKey is None or key < bestKey:
+                    best, bestKey = b, key
+            assert best >= 0, f"No batch has room for '{pod.id}'."
+            loads[best] += sum(1 for other in edges if other not in members[best])
+            majorCounts[best] += isMajor
+            counts[best] += 1
+            members[best].add(pod.id)
+            batches[best].append(pod)
+        return [batch for batch in batches if batch]
+
+    def score(self, batches: list[Batch]):
+        if not batches:
+            return (0, 0)
+        scores = CoverageEvaluator(self.state).batches(batches)
+        return (int(scores[:, 0].max()), int(scores[:, 1].max()))
+
+    def exact(self, pods: list[Pod], batchCount: int, timeLimit: float | None = None) -> list[Batch]:
+        # minimize the largest number of connections covered by one batch, then the largest major count;
+        # a time-limited solve never returns anything worse than the balanced heuristic
+        import pyomo.environ as pyo
+
+        heuristic = self.balanced(pods, batchCount)
+
+        ids = [p.id for p in pods]
+        selected = set(ids)
+        edges = [(s, t) for s, t in self.state.index.pairs if s in selected or t in selected]
+        majors = self.state.pods.majorTypes
+        B = list(range(batchCount))
+
+        model = pyo.ConcreteModel()
+        model.y = pyo.Var(ids, B, domain=pyo.Binary)
+        model.c = pyo.Var(list(range(len(edges))), B, domain=pyo.NonNegativeReals, bounds=(0, 1))
+        model.T = pyo.Var(domain=pyo.NonNegativeReals)
+        model.M = pyo.Var(domain=pyo.NonNegativeReals)
+        model.OBJ = pyo.Objective(expr=(len(ids) + 1) * model.T + model.M, sense=pyo.minimize)
+        model.cons = pyo.ConstraintList()
+        for id in ids:
+            model.cons.add(sum(model.y[id, b] for b in B) == 1)
+        for name, tpods in self.state.pods.types.items():
+            tids = [p.id for p in tpods if p.id in selected]
+            if tids:
+                for b in B:
+                    model.cons.add(sum(model.y[id, b] for id in tids) <= self.capacity(name, batchCount))
+        for e, (s, t) in enumerate(edges):
+            for b in B:
+                for id in (s, t):
+                    if id in selected:
+                        model.cons.add(model.c[e, b] >= model.y[id, b])
+        for b in B:
+            model.cons.add(model.T >= sum(model.c[e, b] for e in range(len(edges))))
+            model.cons.add(model.M >= sum(model.y[p.id, b] for p in pods if p.name in majors))
+
+        opt = pyo.SolverFactory('scip')
+        if timeLimit is not None:
+            opt.options["limits/time"] = timeLimit
+        results = opt.solve(model, load_solutions=False)
+        if len(results.solution) == 0:
+            return heuristic
+        model.solutions.load_from(results)
+
+        batches = [Batch() for _ in B]
+        for pod in pods:
+            b = max(B, key=lambda b: pyo.value(model.y[pod.id, b]))
+            batches[b].append(pod)
+        batches = [batch for batch in batches if batch]
+        return batches if self.score(batches) <= self.score(heuristic) else heuristic
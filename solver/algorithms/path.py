@@ -1,11 +1,17 @@
 from dataclasses import dataclass, field
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict, deque
+from functools import cached_property
+from heapq import heappush, heappop, nsmallest
+from typing import Callable, Iterable, Iterator
+import numpy as np
+from ..profiling import count, peak
 
 
 @dataclass
 class ShortestPathCollector:
     nodes: set[int] = field(default_factory=set)
     edges: dict[int, set[int]] = field(default_factory=dict)
+    weights: dict[tuple[int, int], float] = field(default_factory=dict)
 
     def node(self, *ids: int):
         for item in ids:
@@ -13,19 +19,29 @@ class ShortestPathCollector:
             self.nodes.add(item)
             self.edges[item] = set()
 
-    def edge(self, source: int, *targets: int):
+    def edge(self, source: int, *targets: int, weight: float = 1.0):
         assert source in self.edges
         nexts = self.edges[source]
         for target in targets:
             assert target in self.nodes and target not in nexts
             nexts.add(target)
+            if weight != 1.0:
+                self.weights[(source, target)] = weight
 
-    def biedge(self, source: int, *targets: int):
-        assert source in self.edges
+    def biedge(self, source: int, *targets: int, weight: float = 1.0):
         for target in targets:
-            assert target in self.nodes
-            self.edge(source, target)
-            self.edge(target, source)
+            self.edge(source, target, weight=weight)
+            self.edge(target, source, weight=weight)
+
+    def csr(self):
+        size = max(self.nodes, default=-1) + 1
+        sources = np.fromiter((u for u, vs in self.edges.items() for _ in vs), dtype=np.int64)
+        targets = np.fromiter((v for vs in self.edges.values() for v in vs), dtype=np.int64)
+        weights = None
+        if self.weights:
+            weights = np.fromiter((self.weights.get((u, v), 1.0)
+                                   for u, vs in self.edges.items() for v in vs), dtype=np.float64)
+        return CSRGraph.fromEdges(size, sources, targets, weights)
 
     def shortestPaths(self, source: int, endpoints: set[int] | None = None, ignored: set[int] | None = None):
         ignored = ignored or set()
@@ -59,3 +75,340 @@ class ShortestPathCollector:
                     for pathU in result[u]:
                         result[v].append(pathU + [v])
         return result
+
+
+@dataclass
+class CSRGraph:
+    indptr: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64))
+    indices: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    # edge costs aligned with indices, None for unit (hop-count) costs
+    weights: np.ndarray | None = None
+
+    @classmethod
+    def fromEdges(cls, size: int, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray | None = None):
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        order = np.argsort(sources, kind="stable")
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=size), out=indptr[1:])
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)[order]
+        return cls(indptr, targets[order], weights)
+
+    @property
+    def size(self):
+        return len(self.indptr) - 1
+
+    @cached_property
+    def reverse(self):
+        sources = np.repeat(np.arange(self.size), np.diff(self.indptr))
+        return CSRGraph.fromEdges(self.size, self.indices, sources, self.weights)
+
+    def neighbors(self, node: int):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    @cached_property
+    def lists(self):
+        indices = self.indices.tolist()
+        indptr = self.indptr.tolist()
+        return [indices[indptr[u]:indptr[u + 1]] for u in range(self.size)]
+
+    @cached_property
+    def weightLists(self):
+        if self.weights is None:
+            return [[1.0] * len(vs) for vs in self.lists]
+        weights = self.weights.tolist()
+        indptr = self.indptr.tolist()
+        return [weights[indptr[u]:indptr[u + 1]] for u in range(self.size)]
+
+    def expand(self, nodes: np.ndarray):
+        # flatten the adjacency lists of nodes, returning (position in nodes, neighbor) pairs
+        starts = self.indptr[nodes]
+        degrees = self.indptr[nodes + 1] - starts
+        owners = np.repeat(np.arange(len(nodes)), degrees)
+        offsets = np.arange(degrees.sum()) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+        return owners, self.indices[np.repeat(starts, degrees) + offsets]
+
+    def advance(self, count: np.ndarray, frontierRows: np.ndarray, frontierNodes: np.ndarray):
+        # candidate (row * size + neighbor) slots one hop past the frontier, with the path counts they receive
+        owners, nexts = self.expand(frontierNodes)
+        weights = count[frontierRows, frontierNodes][owners]
+        return frontierRows[owners] * self.size + nexts, weights
+
+    def mask(self, nodes: Iterable[int] | None):
+        result = np.zeros(self.size, dtype=bool)
+        if nodes:
+            result[np.fromiter(nodes, dtype=np.int64)] = True
+        return result
+
+    def shortestPaths(self, sources: Iterable[int], endpoints: Iterable[int] | None = None, ignored: Iterable[int] | None = None):
+        # level-synchronous BFS for all sources at once, one row per source
+        sources = np.fromiter(sources, dtype=np.int64)
+        n = self.size
+        rows = np.arange(len(sources))
+        stop = self.mask(endpoints)
+        skip = self.mask(ignored)
+        dist = np.full((len(sources), n), -1, dtype=np.int32)
+        count = np.zeros((len(sources), n), dtype=np.int64)
+        dist[rows, sources] = 0
+        count[rows, sources] = 1
+        flatDist = dist.reshape(-1)
+        flatCount = count.reshape(-1)
+
+        level = 0
+        frontierRows, frontierNodes = rows, sources
+        while len(frontierRows):
+            if level > 0:
+                # endpoints are reached but never forwarded through
+                keep = ~stop[frontierNodes]
+                frontierRows, frontierNodes = frontierRows[keep], frontierNodes[keep]
+            flat, weights = self.advance(count, frontierRows, frontierNodes)
+            d = flatDist[flat]
+            valid = ~skip[flat % n] & ((d == -1) | (d == level + 1))
+            flat, weights = flat[valid], weights[valid]
+            flatDist[flat] = level + 1
+            np.add.at(flatCount, flat, weights)
+            flat = np.unique(flat)
+            frontierRows, frontierNodes = flat // n, flat % n
+            level += 1
+
+        return ShortestPathTable(self, sources, dist, count, stop)
+
+    def cheapestPath(self, source: int, target: int, forwarders: list[bool],
+                     bannedNodes: set[int], bannedEdges: set[tuple[int, int]]):
+        # Dijkstra on edge costs; only source and forwarders are expanded
+        lists, weightLists = self.lists, self.weightLists
+        dist: dict[int, float] = {source: 0.0}
+        prev: dict[int, int] = {}
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heappop(heap)
+            if u == target:
+                path = [u]
+                while u != source:
+                    u = prev[u]
+                    path.append(u)
+                return d, path[::-1]
+            if d > dist[u] or (u != source and not forwarders[u]):
+                continue
+            for v, w in zip(lists[u], weightLists[u]):
+                if v in bannedNodes or (u, v) in bannedEdges:
+                    continue
+                nd = d + w
+                if nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    prev[v] = u
+                    heappush(heap, (nd, v))
+        return None
+
+    def kShortestPaths(self, source: int, target: int, k: int,
+                       forwarders: list[bool], ignored: Iterable[int] | None = None):
+        # Yen's algorithm; at most k accepted paths and k pending candidates are ever held;
+        # forwarders is (~mask(endpoints)).tolist(), built once by the caller for all pairs
+        ignored = set(ignored or ()) - {source}
+        first = self.cheapestPath(source, target, forwarders, ignored, set())
+        if first is None or k <= 0:
+            return []
+        accepted: list[tuple[float, list[int]]] = [first]
+        candidates: list[tuple[float, list[int]]] = []
+        seen = {tuple(first[1])}
+        while len(accepted) < k:
+            lastCost, lastPath = accepted[-1]
+            for i in range(len(lastPath) - 1):
+                spur, root = lastPath[i], lastPath[:i + 1]
+                bannedEdges = {(path[i], path[i + 1]) for _, path in accepted
+                               if len(path) > i + 1 and path[:i + 1] == root}
+                bannedNodes = ignored | set(root[:-1])
+                found = self.cheapestPath(spur, target, forwarders, bannedNodes, bannedEdges)
+                if found is None:
+                    continue
+                spurCost, spurPath = found
+                path = root[:-1] + spurPath
+                if tuple(path) in seen:
+                    continue
+                seen.add(tuple(path))
+                rootCost = self.pathCost(root)
+                heappush(candidates, (rootCost + spurCost, path))
+            if not candidates:
+                break
+            accepted.append(heappop(candidates))
+            if len(candidates) > k - len(accepted):
+                candidates = nsmallest(k - len(accepted), candidates)
+        return accepted
+
+    def pathCost(self, path: list[int]):
+        lists, weightLists = self.lists, self.weightLists
+        return sum(weightLists[u][lists[u].index(v)] for u, v in zip(path, path[1:]))
+
+
+@dataclass
+class ShortestPathTable:
+    graph: CSRGraph
+    sources: np.ndarray
+    dist: np.ndarray
+    count: np.ndarray
+    stop: np.ndarray
+    _dag: tuple[int, list[int], dict[int, list[int]]] | None = field(default=None, init=False, repr=False)
+    _blocked: tuple[np.ndarray, np.ndarray] | None = field(default=None, init=False, repr=False)
+
+    @cached_property
+    def rows(self):
+        return {int(s): i for i, s in enumerate(self.sources)}
+
+    @property
+    def nbytes(self):
+        # the distance and count arrays, and the counts blockedCount() keeps once it has run
+        return self.dist.nbytes + 2 * self.count.nbytes
+
+    def distance(self, source: int, target: int):
+        return int(self.dist[self.rows[source], target])
+
+    def pathCount(self, source: int, target: int):
+        return int(self.count[self.rows[source], target])
+
+    def blockedCount(self, blocked: np.ndarray):
+        # shortest-path counts that avoid blocked nodes, for all sources at once;
+        # the result is kept for the last mask object seen
+        if self._blocked is not None and self._blocked[0] is blocked:
+            return self._blocked[1]
+        n = self.graph.size
+        alive = ~blocked[self.sources]
+        frontierRows, frontierNodes = np.arange(len(self.sources))[alive], self.sources[alive]
+        count = np.zeros_like(self.count)
+        count[frontierRows, frontierNodes] = 1
+        flatDist = self.dist.reshape(-1)
+        flatCount = count.reshape(-1)
+
+        level = 0
+        while len(frontierRows):
+            if level > 0:
+                keep = ~self.stop[frontierNodes]
+                frontierRows, frontierNodes = frontierRows[keep], frontierNodes[keep]
+            flat, weights = self.graph.advance(count, frontierRows, frontierNodes)
+            valid = (flatDist[flat] == level + 1) & ~blocked[flat % n]
+            flat, weights = flat[valid], weights[valid]
+            np.add.at(flatCount, flat, weights)
+            flat = np.unique(flat)
+            frontierRows, frontierNodes = flat // n, flat % n
+            level += 1
+
+        self._blocked = (blocked, count)
+        return count
+
+    @cached_property
+    def forwarders(self):
+        return (~self.stop).tolist()
+
+    def dag(self, source: int):
+        # predecessor lists on the shortest-path DAG of source, kept for the most recent source only
+        if self._dag is not None and self._dag[0] == source:
+            return self._dag[1], self._dag[2]
+        dist = self.dist[self.rows[source]].tolist()
+        prevs: dict[int, list[int]] = {}
+        self._dag = (source, dist, prevs)
+        return dist, prevs
+
+    def paths(self, source: int, target: int, blocked: set[int] | None = None, weak: bool | None = None) -> Iterator[list[int]]:
+        # walk the shortest-path DAG backwards from target, materializing one path at a time;
+        # weak=False keeps paths avoiding blocked nodes, weak=True keeps paths touching one
+        dist, prevs = self.dag(source)
+        if dist[target] < 0:
+            return
+        blocked = blocked or set()
+        rlists = self.graph.reverse.lists
+        forwarders = self.forwarders
+
+        def predecessors(node: int):
+            result = prevs.get(node)
+            if result is None:
+                d = dist[node] - 1
+                result = [u for u in rlists[node] if dist[u] == d and (u == source or forwarders[u])]
+                prevs[node] = result
+            return result
+
+        healthyMemo: dict[int, bool] = {}
+        weakMemo: dict[int, bool] = {}
+
+        def healthyReach(node: int) -> bool:
+            result = healthyMemo.get(node)
+            if result is None:
+                result = node not in blocked and (node == source or any(healthyReach(u) for u in predecessors(node)))
+                healthyMemo[node] = result
+            return result
+
+        def weakReach(node: int) -> bool:
+            result = weakMemo.get(node)
+            if result is None:
+                result = node in blocked or any(weakReach(u) for u in predecessors(node))
+                weakMemo[node] = result
+            return result
+
+        def viable(node: int, suffixWeak: bool):
+            # prune prefixes that cannot complete into a wanted path, so no dead end is walked twice
+            if weak is None:
+                return True
+            if weak:
+                return suffixWeak or weakReach(node)
+            return healthyReach(node)
+
+        if not viable(target, False):
+            return
+        suffix = [target]
+        flags = [target in blocked]
+        stack = [iter(predecessors(target))]
+        while stack:
+            if suffix[-1] == source:
+                yield suffix[::-1]
+                stack.pop()
+                suffix.pop()
+                flags.pop()
+                continue
+            prev = next(stack[-1], None)
+            if prev is None:
+                stack.pop()
+                suffix.pop()
+                flags.pop()
+                continue
+            if not viable(prev, flags[-1]):
+                continue
+            suffix.append(prev)
+            flags.append(flags[-1] or prev in blocked)
+            stack.append(iter(predecessors(prev)))
+
+
+@dataclass
+class ShortestPathCache:
+    # least recently used tables within a budget of ShortestPathTable.nbytes; a table larger than
+    # the budget is still kept on its own, so that the caller can use it
+    budget: int
+    tables: OrderedDict[int, ShortestPathTable] = field(default_factory=OrderedDict)
+    size: int = 0
+    peak: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def get(self, key: int, build: Callable[[int], ShortestPathTable]):
+        table = self.tables.get(key)
+        if table is not None:
+            self.tables.move_to_end(key)
+            self.hits += 1
+            count("paths.hits")
+            return table
+        self.misses += 1
+        count("paths.misses")
+        table = build(key)
+        while self.tables and self.size + table.nbytes > self.budget:
+            _, old = self.tables.popitem(last=False)
+            self.size -= old.nbytes
+            self.evictions += 1
+            count("paths.evictions")
+        self.tables[key] = table
+        self.size += table.nbytes
+        self.peak = max(self.peak, self.size)
+        peak("paths.bytes", self.peak)
+        return table
+
+    def clear(self):
+        self.tables.clear()
+        self.size = 0
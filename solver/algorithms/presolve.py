@@ -0,0 +1,111 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+import numpy as np
+import pyomo.environ as pyo
+from .cip import CIPInstance
+from ..profiling import count, peak
+
+
+@dataclass
+class Presolve:
+    # reduces a CIPInstance to integer aggregates z[a] in [0, sizes[a]], each standing for interchangeable
+    # variables with the same type, major flag, objective gain and weighted neighbour set
+    instance: CIPInstance
+    C1: float = 100.0
+    C3: float = 10.0
+    C4: float = 1.0
+    # aggregate a holds variables members[indptr[a]:indptr[a+1]]
+    indptr: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64), init=False)
+    members: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32), init=False)
+    # linear objective coefficient of each aggregate
+    gains: list[float] = field(default_factory=list, init=False)
+    # (a, b, w): every variable of a is connected to every variable of b by w directed pairs
+    edges: list[tuple[int, int, int]] = field(default_factory=list, init=False)
+    groups: list[tuple[list[int], int]] = field(default_factory=list, init=False)
+    fixed: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        instance = self.instance
+        n = len(instance.ids)
+        free = np.ones(n, dtype=bool)
+        typeOf = np.zeros(n, dtype=np.int64)
+        typeOf[instance.typeIndices] = np.repeat(np.arange(len(instance.types)), np.diff(instance.typeIndptr))
+        for l, r in instance.groups():
+            if r == 0:
+                free[l] = False
+        gain = -(self.C3 * instance.major + self.C4)
+
+        # a pair with a variable fixed to zero is covered exactly when its other end is selected
+        weights: dict[tuple[int, int], int] = defaultdict(int)
+        for i, j in instance.edges.tolist():
+            if i == j or not free[j]:
+                gain[i] += self.C1 * free[i]
+            elif not free[i]:
+                gain[j] += self.C1
+            else:
+                weights[(i, j) if i < j else (j, i)] += 1
+        neighbors: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        for (i, j), w in weights.items():
+            neighbors[i].append((j, w))
+            neighbors[j].append((i, w))
+
+        # an unconnected variable only costs its penalty
+        free &= np.array([i in neighbors or gain[i] > 0 for i in range(n)], dtype=bool)
+        self.fixed = int(n - free.sum())
+
+        classes: dict[tuple, list[int]] = {}
+        for i in np.flatnonzero(free).tolist():
+            key = (int(typeOf[i]), bool(instance.major[i]), float(gain[i]), tuple(sorted(neighbors[i])))
+            classes.setdefault(key, []).append(i)
+        aggregate = np.full(n, -1, dtype=np.int64)
+        for a, l in enumerate(classes.values()):
+            aggregate[l] = a
+        self.indptr = np.zeros(len(classes) + 1, dtype=np.int64)
+        np.cumsum([len(l) for l in classes.values()], out=self.indptr[1:])
+        self.members = np.array([i for l in classes.values() for i in l], dtype=np.int32)
+        self.gains = [key[2] for key in classes]
+
+        # members of one class are never connected to each other, so aggregates pair up without self loops
+        edges: dict[tuple[int, int], int] = {}
+        for (i, j), w in weights.items():
+            a, b = int(aggregate[i]), int(aggregate[j])
+            edges[(a, b) if a < b else (b, a)] = w
+        self.edges = [(a, b, w) for (a, b), w in edges.items()]
+
+        sizes = self.sizes
+        for l, r in instance.groups():
+            if r <= 0:
+                continue
+            aggregates = sorted({int(aggregate[i]) for i in l if free[i]})
+            if sum(sizes[a] for a in aggregates) > r:
+                self.groups.append((aggregates, r))
+
+        count("presolve.fixed", self.fixed)
+        peak("presolve.aggregates", len(classes))
+        peak("presolve.edges", len(self.edges))
+
+    @property
+    def sizes(self) -> list[int]:
+        return np.diff(self.indptr).tolist()
+
+    def toModel(self):
+        sizes = self.sizes
+        A = list(range(len(sizes)))
+
+        model = pyo.ConcreteModel()
+        model.z = pyo.Var(A, domain=lambda _, a: pyo.Binary if sizes[a] == 1 else pyo.NonNegativeIntegers,
+                          bounds=lambda _, a: (0, sizes[a]))
+        # of the s_a * s_b pairs between two aggregates, (s_a - z_a) * (s_b - z_b) stay uncovered
+        model.OBJ = pyo.Objective(expr=self.C1 * sum(w * (sizes[a] * sizes[b] - (sizes[a] - model.z[a]) * (sizes[b] - model.z[b]))
+                                                     for a, b, w in self.edges)
+                                  + sum(self.gains[a] * model.z[a] for a in A), sense=pyo.maximize)
+        model.cons = pyo.ConstraintList()
+        for l, r in self.groups:
+            model.cons.add(sum(model.z[a] for a in l) <= r)
+        return model
+
+    def expand(self, values: list[float]) -> list[int]:
+        # any z[a] members of an aggregate are interchangeable, take the first ones
+        indptr = self.indptr.tolist()
+        return [i for a, v in enumerate(values)
+                for i in self.members[indptr[a]:indptr[a] + int(round(v))].tolist()]
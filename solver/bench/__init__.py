@@ -0,0 +1,235 @@
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import chain, islice
+from ..serialization import Serializable
+
+
+@dataclass
+class Tier(Serializable):
+    name: str = "small"
+    hosts: int = 4
+    pods: int = 100
+    failures: int = 1
+
+
+TIERS = {tier.name: tier for tier in [
+    Tier("small", 4, 100),
+    Tier("medium", 50, 1000),
+    Tier("large", 500, 10000),
+]}
+
+# cumulative `-X importtime` budget in ms of the modules behind commands that must start fast;
+# numpy, pyomo and rich.console are loaded on first use and would each blow it
+IMPORT_BUDGETS = {
+    "solver.__main__": 80,
+    "solver.model.connection": 60,
+    "solver.model.stream": 60,
+    "solver.generator.__main__": 70,
+    "solver.solver": 100,
+}
+
+# pod type mix of the production scenario: (name, share, redundancy, major)
+POD_TYPES = [
+    ("sm2", 72, 3, False),
+    ("nsim", 6, 1, True),
+    ("sbim", 20, 1, True),
+    ("csdb", 26, 1, False),
+    ("cslb", 8, 1, False),
+]
+
+
+@dataclass
+class PhaseResult(Serializable):
+    time: float = 0
+    # KB the process-wide peak resident size rose by during the phase; 0 when the phase stayed below
+    # an earlier peak, as the high-water mark never goes down
+    peakGrowth: int = 0
+    # KB of the largest child process (SCIP) reaped so far, for phases that ran children, otherwise 0
+    childResidentSize: int = 0
+
+
+@dataclass
+class TierResult(Serializable):
+    tier: Tier = field(default_factory=Tier)
+    weaks: int = 0
+    batches: int = 0
+    phases: dict[str, PhaseResult] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+
+    @contextmanager
+    def phase(self, name: str):
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        ranChildren = after.ru_utime + after.ru_stime > children.ru_utime + children.ru_stime
+        self.phases[name] = PhaseResult(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before,
+                                        after.ru_maxrss if ranChildren else 0)
+
+
+def buildNetwork(tier: Tier):
+    from ..model.fabric import Fabric
+    from ..model.pod import Pod, PodConfig, PodContainer
+
+    assert tier.hosts % 2 == 0, "Hosts are dual-homed in pairs."
+    pods = PodContainer()
+    total = sum(share for _, share, _, _ in POD_TYPES)
+    for name, share, redundancy, major in POD_TYPES:
+        pods.pod(*Pod.fromRange(name, range(max(1, tier.pods * share // total))))
+        pods.configs[name] = PodConfig(redundancy, major)
+    pods.connect("sm2", "csdb", "sbim", "nsim")
+    pods.connect("cslb", "sbim", "nsim")
+
+    # 2 eors and one tor per host, the tors in dual-homed pairs serving 2 hosts each
+    fabric = Fabric(eors=2, tors=tier.hosts, hostsPerGroup=2, homing=2, uplinks=2)
+    return fabric.network(pods), fabric.host
+
+
+def measurePods(state, rounds: int = 20):
+    # rebuild the state's pods and run the id-heavy loops of batches on them; returns the bytes the pods hold
+    from ..model.pod import Pod, PodContainer
+    from ..model.solution import Batch
+
+    tracemalloc.start()
+    pods = PodContainer()
+    for name, members in state.pods.types.items():
+        pods.pod(*Pod.fromRange(name, [p.no for p in members]))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    batch = Batch()
+    batch.extend(pods.values())
+    for _ in range(rounds):
+        batch.majors(state)
+        batch.coveredConnection(state)
+        ids = {p.id for p in pods.values()}
+        assert len(ids) == len(pods)
+    return size
+
+
+def importTime(module: str, rounds: int = 3):
+    # the fastest of some fresh interpreters, in ms, so that a cold file cache does not count
+    best = float("inf")
+    for _ in range(rounds):
+        stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                capture_output=True, text=True, check=True).stderr
+        for line in stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                best = min(best, int(parts[1]) / 1000)
+    return best
+
+
+def overBudget(imports: dict[str, float]):
+    # modules importing slower than their budget, with (measured, budget) in ms
+    return {module: (value, IMPORT_BUDGETS[module]) for module, value in imports.items()
+            if module in IMPORT_BUDGETS and value > IMPORT_BUDGETS[module]}
+
+
+def runTier(tier: Tier, solve: bool = True, pathSamples: int = 1000, pathBudget: int | None = None):
+    from ..generator import ProbabilityConnectionStateGenerator
+    from ..profiling import profiler, peak
+
+    profiler.reset()
+    result = TierResult(tier)
+    with result.phase("build"):
+        net, host = buildNetwork(tier)
+    with result.phase("freeze"):
+        frenet = net.freeze(pathBudget)
+    frenet.off(*random.choices(list(chain.from_iterable(h.inames() for h in host)), k=tier.failures))
+    with result.phase("paths"):
+        for s, t in islice(frenet.connectedPairs(), pathSamples):
+            for _ in frenet.iterState(s, t):
+                pass
+    with result.phase("probability"):
+        gen = ProbabilityConnectionStateGenerator.fromNetwork(frenet)
+    with result.phase("generate"):
+        state = gen.generate()
+    result.weaks = len(state.pairs)
+    with result.phase("pods"):
+        peak("pods.bytes", measurePods(state))
+    result.counters = dict(profiler.counters)
+    if not solve:
+        return result
+
+    from ..algorithms.cip import CIPSolver
+    from ..solver import CIPMultipleBatchSolver
+    with result.phase("compile"):
+        cip = CIPSolver(state).compile()
+    with result.phase("solve"):
+        cip.solve()
+    with result.phase("batches"):
+        solution = CIPMultipleBatchSolver().solve(state)
+    result.batches = len(solution)
+    result.counters = dict(profiler.counters)
+    return result
+
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(tiers: list[str], seed: int = 0, solve: bool = True, pathBudget: int | None = None):
+    results = []
+    for name in tiers:
+        random.seed(seed)
+        results.append(runTier(TIERS[name], solve, pathBudget=pathBudget))
+    return {
+        "commit": commit(),
+        "python": sys.version.split()[0],
+        "seed": seed,
+        "pathBudget": pathBudget,
+        "imports": {module: importTime(module) for module in IMPORT_BUDGETS},
+        "tiers": [r.dump() for r in results],
+    }, results
+
+
+def display(results: list[TierResult], imports: dict[str, float] | None = None):
+    from rich import print
+    for module, value in (imports or {}).items():
+        budget = IMPORT_BUDGETS.get(module)
+        over = budget is not None and value > budget
+        print(f"import {module:>26}: {value:>8.1f} ms" + (f" [red](budget {budget} ms)[/red]" if over else ""))
+    for result in results:
+        tier = result.tier
+        print(f"[bold]{tier.name}[/bold]: {tier.hosts} hosts, {tier.pods} pods, "
+              f"{result.weaks} weak connections, {result.batches} batches")
+        for name, phase in result.phases.items():
+            print(f"  {name:>12}: {phase.time:>10.4f} s, +{phase.peakGrowth / 1024:>9.2f} MB peak"
+                  + (f", {phase.childResidentSize / 1024:.2f} MB child peak" if phase.childResidentSize else ""))
+        if result.counters:
+            print("  " + ", ".join(f"{k} {v}" for k, v in result.counters.items()))
+
+
+def compare(base: dict, current: dict):
+    from rich import print
+    baseTiers = {t["tier"]["name"]: t for t in base["tiers"]}
+    print(f"Compare {current['commit'][:8] or 'current'} against {base['commit'][:8] or 'base'}:")
+    baseImports = base.get("imports", {})
+    for module, new in current.get("imports", {}).items():
+        if module in baseImports:
+            old = baseImports[module]
+            print(f"  import {module}: {old:.1f} ms -> {new:.1f} ms ({new / old if old > 0 else float('inf'):.2f}x)")
+    for tier in current["tiers"]:
+        name = tier["tier"]["name"]
+        if name not in baseTiers:
+            continue
+        print(f"[bold]{name}[/bold]:")
+        basePhases = baseTiers[name]["phases"]
+        for phase, value in tier["phases"].items():
+            if phase not in basePhases:
+                continue
+            old, new = basePhases[phase]["time"], value["time"]
+            ratio = new / old if old > 0 else float("inf")
+            print(f"  {phase:>12}: {old:>10.4f} s -> {new:>10.4f} s ({ratio:.2f}x)")
@@ -1,11 +1,15 @@
 import random
+from typing import TYPE_CHECKING
 from ..model.pod import PodContainer, Pod, PodConfig
 from ..model.connection import ConnectionState
-from ..model.network import FreezedNetwork
 from ..serialization import Serializable
+from ..profiling import phase, count
 from itertools import combinations
 from dataclasses import dataclass, field
 
+if TYPE_CHECKING:
+    from ..model.network import FreezedNetwork
+
 
 class RandomConnectionStateGenerator:
     def pods(self, pods: PodContainer, podCount: int, typeCount: int, majorRate: float = 0.2):
@@ -32,25 +36,95 @@ class RandomConnectionStateGenerator:
             state.weak(p1, p2)
 
 
+@dataclass
+class BulkConnectionStateGenerator:
+    # samples weak connections uniformly over the pod pairs of connected types, in vectorized chunks
+    seed: int | None = None
+    chunk: int = 1 << 18
+
+    def state(self, state: ConnectionState, weaks: int):
+        # adds distinct connections until the state has `weaks` of them, or every allowed pair is used
+        import numpy as np
+        with phase("generate"):
+            # unseeded, follow the global generator so that seeded scripts stay reproducible
+            rng = np.random.default_rng(self.seed if self.seed is not None else random.getrandbits(64))
+            types = state.pods.types
+            ids = list(state.pods)
+            position = {id: i for i, id in enumerate(ids)}
+            names = list(types)
+            members = np.array([position[p.id] for name in names for p in types[name]], dtype=np.int64)
+            sizes = np.array([len(types[name]) for name in names], dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            typeInt = {name: i for i, name in enumerate(names)}
+            # both directions of every connected type pair, weighted by their number of pod pairs
+            pairs = sorted({(typeInt[x], typeInt[y]) for a, b in state.pods.topo if a in typeInt and b in typeInt
+                            for x, y in ((a, b), (b, a))})
+            assert pairs, "No connected pod types."
+            xs = np.array([x for x, _ in pairs], dtype=np.int64)
+            ys = np.array([y for _, y in pairs], dtype=np.int64)
+            weights = (sizes[xs] * sizes[ys]).astype(float)
+            # stop at the target or once every allowed pod pair is taken
+            allowed = set(pairs)
+            taken = sum(1 for x, y in state.pairs if (typeInt[state.pods[x].name], typeInt[state.pods[y].name]) in allowed)
+            capacity = int(weights.sum())
+            size = len(state.edges)
+            target = min(weaks, size - taken + capacity)
+            weights /= weights.sum()
+
+            # rejection sampling while most allowed pairs are free, as every draw then likely adds a connection
+            while size < target and 4 * (capacity - taken) >= capacity:
+                k = rng.choice(len(pairs), size=self.chunk, p=weights)
+                x, y = xs[k], ys[k]
+                sources = members[offsets[x] + (rng.random(self.chunk) * sizes[x]).astype(np.int64)]
+                targets = members[offsets[y] + (rng.random(self.chunk) * sizes[y]).astype(np.int64)]
+                added = state.weakIndexed(ids, sources, targets, target - size)
+                size += added
+                taken += added
+            # close to saturation, list the free pairs and draw the rest from them without replacement;
+            # at least 3/4 of the allowed pairs are stored already, so the listing is no larger than the state
+            if size < target:
+                sources, targets = np.concatenate([np.stack(np.meshgrid(members[offsets[x]:offsets[x] + sizes[x]],
+                                                                        members[offsets[y]:offsets[y] + sizes[y]],
+                                                                        indexing="ij")).reshape(2, -1)
+                                                   for x, y in pairs], axis=1)
+                edges = state.edges
+                remap = np.array([edges.intern(id) for id in ids], dtype=np.int64)
+                knownSources, knownTargets = edges.arrays()
+                known = knownSources << 32 | knownTargets
+                free = np.flatnonzero(~np.isin(remap[sources] << 32 | remap[targets], known))
+                free = rng.choice(free, size=min(target - size, len(free)), replace=False)
+                size += state.weakIndexed(ids, sources[free], targets[free])
+            count("generate.weaks", size)
+        return state
+
+
 @dataclass
 class ProbabilityConnectionStateGenerator(Serializable):
     pods: PodContainer = field(default_factory=PodContainer)
     probabilities: dict[tuple[str, str], float] = field(default_factory=dict)
 
     @classmethod
-    def fromNetwork(cls, network: FreezedNetwork):
-        result = cls(network.pods.copy())
-        for s, t in network.connectedPairs():
-            healthy, weak = network.state(s, t)
-            total = (len(healthy) + len(weak))
-            result.probabilities[(s, t)] = (len(weak) / total) if total > 0 else 0.0
+    def fromNetwork(cls, network: "FreezedNetwork", k: int | None = None):
+        # k=None uses all hop-count shortest paths, otherwise the ECMP split over the k cheapest weighted paths
+        with phase("probability"):
+            result = cls(network.pods.copy())
+            for s, t in network.connectedPairs():
+                if k is None:
+                    healthy, weak = network.stateCount(s, t)
+                else:
+                    healthy, weak = network.ecmpState(s, t, k)
+                total = healthy + weak
+                result.probabilities[(s, t)] = (weak / total) if total > 0 else 0.0
+            count("probability.pairs", len(result.probabilities))
         return result
 
     def generate(self):
-        result = ConnectionState(self.pods)
-        for (s, t), p in self.probabilities.items():
-            if random.random() < p:
-                result.weak(s, t)
-            if random.random() < p:
-                result.weak(t, s)
+        with phase("generate"):
+            result = ConnectionState(self.pods)
+            for (s, t), p in self.probabilities.items():
+                if random.random() < p:
+                    result.weak(s, t)
+                if random.random() < p:
+                    result.weak(t, s)
+            count("generate.weaks", len(result.pairs))
         return result
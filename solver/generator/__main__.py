@@ -1,14 +1,26 @@
+import importlib
 import sys
 from pathlib import Path
-from rich import print
 import json
 
-def main(buildScript: str):
+
+class ScriptNamespace(dict):
+    # globals of a build script; the network model pulls in numpy, so it is only imported once a script names it
+    lazy = {name: "..model.network" for name in ("Network", "NetworkTopo", "FreezedNetwork", "Device", "DeviceInterface")}
+    lazy["Fabric"] = "..model.fabric"
+
+    def __missing__(self, name: str):
+        if name not in self.lazy:
+            raise KeyError(name)
+        value = self[name] = getattr(importlib.import_module(self.lazy[name], __package__), name)
+        return value
+
+
+def main(buildScript: str, jsonl: bool = False, seed: int | None = None):
     from ..model.connection import ConnectionState
-    from ..model.network import Network, NetworkTopo, FreezedNetwork, Device, DeviceInterface
     from ..model.pod import Pod, PodConfig, PodContainer
     from ..model.solution import Solution, Batch
-    from ..generator import RandomConnectionStateGenerator, ProbabilityConnectionStateGenerator
+    from ..generator import RandomConnectionStateGenerator, ProbabilityConnectionStateGenerator, BulkConnectionStateGenerator
 
     stateToSolve: ConnectionState = None
 
@@ -16,12 +28,35 @@ def main(buildScript: str):
         nonlocal stateToSolve
         stateToSolve = state
 
-    exec(buildScript, locals())
+    from ..profiling import profiler
+    if seed is not None:
+        # scripts draw from the global generators, which makes a seeded run reproducible
+        import random
+        import numpy as np
+        random.seed(seed)
+        np.random.seed(seed)
+    exec(buildScript, ScriptNamespace(locals()))
     assert stateToSolve is not None
-    print(json.dumps(stateToSolve.dump()))
+    profiler.annotate(stateToSolve.status)
+    if jsonl:
+        from ..model import stream
+        stream.write(stream.stateRecords(stateToSolve))
+    else:
+        print(json.dumps(stateToSolve.dump()))
 
 if __name__ == "__main__":
-    assert len(sys.argv) == 2, "Must have a file argument."
+    assert len(sys.argv) >= 2, "Must have a file argument."
     file = Path(sys.argv[1])
     assert file.is_file(), "Must have a file argument."
-    main(file.read_text())
+    jsonl, seed = False, None
+    args = sys.argv[2:]
+    while args:
+        option = args.pop(0)
+        if option == "--jsonl":
+            jsonl = True
+        elif option == "--seed":
+            assert args, "Option '--seed' needs a value."
+            seed = int(args.pop(0))
+        else:
+            assert False, f"Unknown option '{option}'."
+    main(file.read_text(), jsonl, seed)
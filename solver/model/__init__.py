@@ -1,6 +1,5 @@
 from ..serialization import Serializable
-from dataclasses import dataclass
-from rich import print
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -10,6 +9,24 @@ class ExecutionStatus(Serializable):
     cpuPercent: int = 0
     wallClock: float = 0
     maxResidentSize: float = 0
+    phases: dict[str, float] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        # statuses dumped before phases existed load them as None
+        self.phases = self.phases or {}
+        self.counters = self.counters or {}
+
+    def measured(self, inner: "ExecutionStatus"):
+        # combine process-level measurements with the phases recorded inside the process
+        self.phases = dict(inner.phases)
+        self.counters = dict(inner.counters)
+        return self
 
     def display(self):
+        from .summary import print
         print(f"Status: {self.wallClock:.4f} s ({self.cpuPercent}% CPU), {self.maxResidentSize / 1024:.4f} MB")
+        if self.phases:
+            print("  Phases: " + ", ".join(f"{k} {v:.4f} s" for k, v in self.phases.items()))
+        if self.counters:
+            print("  Counters: " + ", ".join(f"{k} {v}" for k, v in self.counters.items()))
@@ -1,39 +1,324 @@
+from array import array
 from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING
 
 from . import ExecutionStatus
 from .pod import PodContainer, Pod
 from ..serialization import Serializable
-from rich import print
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+@dataclass
+class EdgeIndex:
+    # an index over the target lists of a ConnectionState, which remain the stored connections:
+    # the distinct connections as interned endpoint ints in parallel arrays, with the position of each by key
+    ids: list[str] = field(default_factory=list)
+    id2int: dict[str, int] = field(default_factory=dict)
+    sources: array = field(default_factory=lambda: array("q"))
+    targets: array = field(default_factory=lambda: array("q"))
+    positions: dict[int, int] = field(default_factory=dict)
+    outDegrees: array = field(default_factory=lambda: array("q"))
+    inDegrees: array = field(default_factory=lambda: array("q"))
+
+    @classmethod
+    def fromState(cls, state: "ConnectionState"):
+        result = cls()
+        for source, targets in state.items():
+            for target in targets:
+                result.add(source, target)
+        return result
+
+    def intern(self, id: str):
+        i = self.id2int.get(id)
+        if i is None:
+            i = self.id2int[id] = len(self.ids)
+            self.ids.append(id)
+            self.outDegrees.append(0)
+            self.inDegrees.append(0)
+        return i
+
+    def add(self, source: str, target: str):
+        # False for a connection that is already indexed
+        s, t = self.intern(source), self.intern(target)
+        key = s << 32 | t
+        if key in self.positions:
+            return False
+        self.positions[key] = len(self.sources)
+        self.sources.append(s)
+        self.targets.append(t)
+        self.outDegrees[s] += 1
+        self.inDegrees[t] += 1
+        return True
+
+    def remove(self, source: str, target: str):
+        # False for a connection that is not indexed; the last connection takes the place of the removed one
+        s, t = self.id2int.get(source), self.id2int.get(target)
+        if s is None or t is None:
+            return False
+        e = self.positions.pop(s << 32 | t, None)
+        if e is None:
+            return False
+        lastSource, lastTarget = self.sources.pop(), self.targets.pop()
+        if e < len(self.sources):
+            self.sources[e], self.targets[e] = lastSource, lastTarget
+            self.positions[lastSource << 32 | lastTarget] = e
+        self.outDegrees[s] -= 1
+        self.inDegrees[t] -= 1
+        return True
+
+    def extend(self, sources: "np.ndarray", targets: "np.ndarray", limit: int | None = None):
+        # bulk add by interned ints, at most limit of them; returns the mask of connections that were added
+        import numpy as np
+        keys = sources << 32 | targets
+        _, first = np.unique(keys, return_index=True)
+        mask = np.zeros(len(keys), dtype=bool)
+        mask[first] = True
+        known = self.positions
+        mask &= np.fromiter((key not in known for key in keys.tolist()), dtype=bool, count=len(keys))
+        if limit is not None:
+            mask[np.flatnonzero(mask)[limit:]] = False
+        sources, targets = sources[mask], targets[mask]
+        known.update(zip(keys[mask].tolist(), range(len(self.sources), len(self.sources) + len(sources))))
+        self.sources.extend(sources.tolist())
+        self.targets.extend(targets.tolist())
+        for degrees, ends in ((self.outDegrees, sources), (self.inDegrees, targets)):
+            for i, d in zip(*np.unique(ends, return_counts=True)):
+                degrees[i] += int(d)
+        return mask
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __contains__(self, pair: tuple[str, str]):
+        s, t = self.id2int.get(pair[0]), self.id2int.get(pair[1])
+        return s is not None and t is not None and (s << 32 | t) in self.positions
+
+    def __getitem__(self, e: int):
+        return self.ids[self.sources[e]], self.ids[self.targets[e]]
+
+    def __iter__(self):
+        ids = self.ids
+        return ((ids[s], ids[t]) for s, t in zip(self.sources, self.targets))
+
+    def degree(self, id: str):
+        i = self.id2int.get(id)
+        return 0 if i is None else self.outDegrees[i] + self.inDegrees[i]
+
+    def arrays(self):
+        # copies, so the arrays can keep growing
+        import numpy as np
+        return np.array(self.sources, dtype=np.int64), np.array(self.targets, dtype=np.int64)
+
+
+@dataclass
+class PairIndex:
+    # pod i is ids[i]; pairs[e] is the e-th distinct weak connection, with pod ints edges[e];
+    # the connections touching pod i are incidents[indptr[i]:indptr[i+1]]
+    ids: list[str]
+    id2int: dict[str, int]
+    pairs: list[tuple[str, str]]
+    edges: "np.ndarray"
+    indptr: "np.ndarray"
+    incidents: "np.ndarray"
+
+    @classmethod
+    def fromState(cls, state: "ConnectionState"):
+        import numpy as np
+        store = state.edges
+        id2int = {id: i for i, id in enumerate(state.pods)}
+        for id in store.ids:
+            if id not in id2int:
+                id2int[id] = len(id2int)
+        remap = np.array([id2int[id] for id in store.ids], dtype=np.int64)
+        sources, targets = store.arrays()
+        edges = np.stack([remap[sources], remap[targets]], axis=1).reshape(-1, 2)
+        pairs = list(store)
+        # a self loop is listed once for its pod
+        loops = edges[:, 0] == edges[:, 1]
+        ends = np.concatenate([edges[:, 0], edges[~loops, 1]])
+        owners = np.concatenate([np.arange(len(pairs)), np.flatnonzero(~loops)])
+        order = np.argsort(ends, kind="stable")
+        indptr = np.zeros(len(id2int) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=len(id2int)), out=indptr[1:])
+        return cls(list(id2int), id2int, pairs, edges, indptr, owners[order])
+
+    def incident(self, id: str) -> "np.ndarray":
+        i = self.id2int.get(id)
+        if i is None:
+            return self.incidents[:0]
+        return self.incidents[self.indptr[i]:self.indptr[i + 1]]
+
+    def covered(self, ids) -> set[tuple[str, str]]:
+        pairs = self.pairs
+        result: set[int] = set()
+        for id in ids:
+            result.update(self.incident(id).tolist())
+        return {pairs[e] for e in result}
 
 
 @dataclass
 class ConnectionState(Serializable, dict[str, list[str]]):
     pods: PodContainer = field(default_factory=PodContainer)
     status: ExecutionStatus = field(default_factory=ExecutionStatus)
+    # the target lists hold the connections; the edge index is built from them on first use and kept up to date
+    # by weak() and unweak(), other dict mutations drop it, editing the target lists in place does not
+    _edges: EdgeIndex | None = field(default=None, init=False, repr=False, compare=False)
+    _index: PairIndex | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def edges(self):
+        if self._edges is None:
+            self._edges = EdgeIndex.fromState(self)
+        return self._edges
 
     @property
     def pairs(self):
-        return [(source, target) for source, targets in self.items() for target in targets]
+        # the distinct weak connections, a sequence backed by the edge index rather than a copy
+        return self.edges
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = PairIndex.fromState(self)
+        return self._index
+
+    def hasWeak(self, source: str, target: str):
+        return (source, target) in self.edges
+
+    def degree(self, id: str):
+        return self.edges.degree(id)
+
+    def invalidate(self):
+        self._edges = None
+        self._index = None
+
+    def __getstate__(self):
+        # workers rebuild the edge index and pair index on demand instead of receiving them
+        state = dict(self.__dict__)
+        state["_edges"] = None
+        state["_index"] = None
+        return state
+
+    def __setitem__(self, key: str, value: list[str]):
+        self.invalidate()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key: str):
+        self.invalidate()
+        dict.__delitem__(self, key)
+
+    def pop(self, *args):
+        self.invalidate()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.invalidate()
+        return dict.popitem(self)
+
+    def setdefault(self, key: str, default: list[str]):
+        self.invalidate()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self.invalidate()
+        dict.update(self, *args, **kwargs)
+
+    def clear(self):
+        self.invalidate()
+        dict.clear(self)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def podId(self, pod: str | Pod):
+        # ids already in the container are canonical, others are normalized before the check
+        id = pod if isinstance(pod, str) else pod.id
+        if id not in self.pods:
+            id = Pod.fromId(id).id if isinstance(pod, str) else id
+            assert id in self.pods, f"Pod '{id}' not found"
+        return id
 
     def weak(self, source: str | Pod, *targets: str | Pod):
-        if isinstance(source, str):
-            source = Pod.fromId(source)
-        assert source.id in self.pods, f"Pod '{source.id}' not found"
-        if source.id not in self:
-            self[source.id] = []
+        # a connection that is already stored is not added again
+        source = self.podId(source)
+        edges = self.edges
+        if source not in self:
+            dict.__setitem__(self, source, [])
+        targetList = dict.__getitem__(self, source)
         for target in targets:
-            if isinstance(target, str):
-                target = Pod.fromId(target)
-            assert target.id in self.pods, f"Pod '{target.id}' not found"
-            self[source.id].append(target.id)
+            target = self.podId(target)
+            if edges.add(source, target):
+                targetList.append(target)
+        self._index = None
+
+    def unweak(self, source: str | Pod, *targets: str | Pod):
+        # remove stored connections, ignoring ones that are not stored
+        source = source if isinstance(source, str) else source.id
+        targetList = dict.get(self, source)
+        if targetList is None:
+            return
+        edges = self.edges
+        for target in targets:
+            target = target if isinstance(target, str) else target.id
+            if edges.remove(source, target):
+                targetList.remove(target)
+        if not targetList:
+            dict.__delitem__(self, source)
+        self._index = None
+
+    def weakIndexed(self, ids: list[str], sources: "np.ndarray", targets: "np.ndarray", limit: int | None = None):
+        # bulk weak() for connections ids[sources[e]] -> ids[targets[e]], where ids are pods of the container;
+        # adds at most limit new connections and returns how many were added
+        import numpy as np
+        assert all(id in self.pods for id in ids), "Pods not found"
+        edges = self.edges
+        remap = np.array([edges.intern(id) for id in ids], dtype=np.int64)
+        mask = edges.extend(remap[sources], remap[targets], limit)
+        for s, t in zip(sources[mask].tolist(), targets[mask].tolist()):
+            source = ids[s]
+            targetList = dict.get(self, source)
+            if targetList is None:
+                targetList = []
+                dict.__setitem__(self, source, targetList)
+            targetList.append(ids[t])
+        self._index = None
+        return int(mask.sum())
 
     def weaks(self, *edges: tuple[str | Pod, str | Pod]):
         for x, y in edges:
             self.weak(x, y)
 
     def display(self):
+        from .summary import print
         self.pods.display()
         print(f"{len(self.pairs)} Weak Connections:")
         for source, targets in self.items():
             print(f"  {source} -> {', '.join(targets)}")
         self.status.display()
+
+    def summary(self, top: int = 10):
+        # per-type aggregates, the best connected pods and a degree histogram, from one pass over the edge index
+        import numpy as np
+        from .summary import print
+        from . import summary
+        pods, store = self.pods, self.edges
+        self.pods.summary()
+        names = [pods[id].name if id in pods else Pod.fromId(id).name for id in store.ids]
+        typeNames = sorted(set(names))
+        typeInt = {name: i for i, name in enumerate(typeNames)}
+        typeOf = np.array([typeInt[name] for name in names], dtype=np.int64)
+        sources, targets = store.arrays()
+        T = len(typeNames)
+        codes = np.bincount(typeOf[sources] * T + typeOf[targets], minlength=T * T).tolist()
+        counts = {(typeNames[c // T], typeNames[c % T]): n for c, n in enumerate(codes) if n}
+        degrees = dict.fromkeys(pods, 0)
+        for i, id in enumerate(store.ids):
+            degrees[id] = store.outDegrees[i] + store.inDegrees[i]
+        print(f"{len(store)} Weak Connections:")
+        print(summary.pairs(counts, top))
+        print(summary.ranking("Most connected pods", degrees.items(), top, "connections"))
+        print(summary.histogram("Connections per pod", degrees.values()))
+        self.status.display()
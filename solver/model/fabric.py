@@ -0,0 +1,78 @@
+import random
+from dataclasses import dataclass, field
+from .network import Device, Network, NetworkTopo
+from .pod import PodContainer
+from ..serialization import Serializable
+from ..profiling import phase, count
+
+
+@dataclass
+class Fabric(Serializable):
+    # a leaf-spine template: every tor has `uplinks` cables to each eor, and tors are grouped by `homing`,
+    # each group serving `hostsPerGroup` hosts that have one cable to every tor of their group
+    eors: int = 2
+    tors: int = 2
+    hostsPerGroup: int = 2
+    homing: int = 2
+    uplinks: int = 2
+    # how pods are bound to hosts: "random" picks a host per pod, "spread" deals pods round-robin,
+    # "packed" fills hosts in order
+    placement: str = "random"
+    # tor port of the first host downlink, after the uplinks by default; 0 has them share the first uplink ports,
+    # as the hand-built topology of exp.py did
+    downlinkPort: int | None = None
+    eor: list[Device] = field(default_factory=list, init=False)
+    tor: list[Device] = field(default_factory=list, init=False)
+    host: list[Device] = field(default_factory=list, init=False)
+
+    def __post_init__(self):
+        assert self.tors % self.homing == 0, "Tors must split into groups of `homing`."
+        assert self.placement in ("random", "spread", "packed"), f"Unknown placement '{self.placement}'."
+        assert self.downlinkPort is None or 0 <= self.downlinkPort <= self.eors * self.uplinks, "Bad downlink port."
+        # tor ports: uplinks to eor i on i * uplinks + k, then one port per host of the group
+        self.eor = [Device(f"eor-{i}", self.tors * self.uplinks) for i in range(self.eors)]
+        self.tor = [Device(f"tor-{i}", self.eors * self.uplinks + self.hostsPerGroup) for i in range(self.tors)]
+        self.host = [Device(f"host-{i}", self.homing) for i in range(self.hosts)]
+
+    def load(self, raw: dict):
+        super().load(raw)
+        self.__post_init__()
+
+    @property
+    def hosts(self):
+        return self.tors // self.homing * self.hostsPerGroup
+
+    def cables(self):
+        # interface name pairs of every cable, built without per-cable lookups
+        uplinks = self.uplinks
+        down = self.eors * uplinks if self.downlinkPort is None else self.downlinkPort
+        for i, eor in enumerate(self.eor):
+            for j, tor in enumerate(self.tor):
+                for k in range(uplinks):
+                    yield f"{eor.id}:{j * uplinks + k}", f"{tor.id}:{i * uplinks + k}"
+        for h, host in enumerate(self.host):
+            group, slot = divmod(h, self.hostsPerGroup)
+            for k in range(self.homing):
+                yield f"{self.tor[group * self.homing + k].id}:{down + slot}", f"{host.id}:{k}"
+
+    def topo(self):
+        topo = NetworkTopo()
+        topo.device(*self.eor, *self.tor, *self.host)
+        topo.cableNames(self.cables())
+        return topo
+
+    def place(self, pods: PodContainer):
+        hosts, n = self.host, len(pods)
+        if self.placement == "random":
+            return [random.choice(hosts).id for _ in range(n)]
+        if self.placement == "spread":
+            return [hosts[i % len(hosts)].id for i in range(n)]
+        return [hosts[i * len(hosts) // n].id for i in range(n)]
+
+    def network(self, pods: PodContainer):
+        with phase("fabric"):
+            net = Network(self.topo(), pods)
+            net.bindIds(zip(pods, self.place(pods)))
+            count("fabric.devices", len(net.topo))
+            count("fabric.cables", sum(len(v) for v in net.topo.cables.values()))
+        return net
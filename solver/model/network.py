@@ -1,24 +1,30 @@
 from dataclasses import dataclass, field
 from functools import cached_property
-from itertools import combinations
+from itertools import chain, combinations, islice
+from typing import Iterable, Iterator
+import numpy as np
 
-from ..algorithms.path import ShortestPathCollector
+from ..algorithms.path import CSRGraph, ShortestPathCache, ShortestPathCollector, ShortestPathTable
 
 from .pod import Pod, PodContainer
 from ..serialization import Serializable
+from ..profiling import phase, count, peak
 
 
 @dataclass
 class Device(Serializable):
     id: str = "device"
     ports: int = field(default=2)
+    # cost of crossing the device, split over its two internal hops
+    weight: float = 1.0
 
     def iname(self, num: int):
         assert 0 <= num < self.ports
         return f"{self.id}:{num}"
 
     def inames(self):
-        return [self.iname(i) for i in range(self.ports)]
+        id = self.id
+        return [f"{id}:{i}" for i in range(self.ports)]
 
 
 DeviceInterface = tuple[Device, int]
@@ -27,8 +33,10 @@ DeviceInterface = tuple[Device, int]
 @dataclass
 class NetworkTopo(Serializable, dict[str, Device]):
     cables: dict[str, set[str]] = field(default_factory=dict)
+    # cable costs for cables not using the default cost of 1
+    weights: dict[str, dict[str, float]] = field(default_factory=dict)
 
-    def cable(self, source: DeviceInterface, target: DeviceInterface):
+    def cable(self, source: DeviceInterface, target: DeviceInterface, weight: float = 1.0):
         sW, sI = source
         tW, tI = target
         assert sW.id in self and tW.id in self
@@ -36,9 +44,27 @@ class NetworkTopo(Serializable, dict[str, Device]):
         tI = tW.iname(tI)
         if sI > tI:
             sI, tI = tI, sI
-        if sI not in self:
+        if sI not in self.cables:
             self.cables[sI] = set()
         self.cables[sI].add(tI)
+        if weight != 1.0:
+            self.weights.setdefault(sI, {})[tI] = weight
+
+    def cableNames(self, pairs: Iterable[tuple[str, str]]):
+        # bulk cable() by interface names, for builders that generate valid names
+        cables = self.cables
+        for sI, tI in pairs:
+            if sI > tI:
+                sI, tI = tI, sI
+            targets = cables.get(sI)
+            if targets is None:
+                targets = cables[sI] = set()
+            targets.add(tI)
+
+    def cableWeight(self, source: str, target: str):
+        if source > target:
+            source, target = target, source
+        return self.weights.get(source, {}).get(target, 1.0)
 
     def device(self, *devices: Device):
         for device in devices:
@@ -46,7 +72,7 @@ class NetworkTopo(Serializable, dict[str, Device]):
             self[device.id] = device
 
     def ports(self):
-        return sum((v.inames() for v in self.values()), start=[]) + list(self.keys())
+        return list(chain.from_iterable(v.inames() for v in self.values())) + list(self.keys())
 
 
 @dataclass
@@ -59,11 +85,17 @@ class Network(Serializable):
         assert pod.id in self.pods and device.id in self.topo
         self.binds[pod.id] = device.id
 
+    def bindIds(self, pairs: Iterable[tuple[str, str]]):
+        # bulk bind() by pod and device ids
+        binds = dict(pairs)
+        assert all(id in self.pods for id in binds) and all(id in self.topo for id in set(binds.values()))
+        self.binds.update(binds)
+
     def ports(self):
         return self.topo.ports() + list(self.pods.keys())
 
-    def freeze(self):
-        return FreezedNetwork(topo=self.topo, pods=self.pods, binds=self.binds)
+    def freeze(self, budget: int | None = None):
+        return FreezedNetwork(topo=self.topo, pods=self.pods, binds=self.binds, budget=budget)
     
     def connectedPairs(self):
         for x, y in combinations(self.binds.keys(), 2):
@@ -74,12 +106,27 @@ class Network(Serializable):
 @dataclass
 class FreezedNetwork(Network):
     weakInts: set[int] = field(default_factory=set)
+    # bytes of path tables to keep; None builds the tables of every pod up front, otherwise the
+    # table of a source is built on its first use and the least recently used ones are dropped
+    budget: int | None = None
     id2int: dict[str, int] = field(default_factory=dict, init=False)
     int2id: dict[int, str] = field(default_factory=dict, init=False)
-    paths: dict[int, dict[int, list["LinkPath"]]] = field(
+    graph: CSRGraph = field(default_factory=CSRGraph, init=False)
+    tables: dict[int, ShortestPathTable] = field(
         default_factory=dict, init=False)
+    cache: ShortestPathCache | None = field(default=None, init=False)
+    # pod ints, and the pods of each pod's type, which a path never passes through
+    podInts: set[int] = field(default_factory=set, init=False)
+    sameTypes: dict[int, list[int]] = field(default_factory=dict, init=False)
+    # nodes a path may pass through, shared by every kPaths() query
+    forwarders: list[bool] = field(default_factory=list, init=False)
+    _weakMask: np.ndarray | None = field(default=None, init=False, repr=False)
 
     def __post_init__(self):
+        with phase("freeze"):
+            self.build()
+
+    def build(self):
         ports = self.ports()
         self.id2int = {k: i for i, k in enumerate(ports)}
         self.int2id = {v: k for k, v in self.id2int.items()}
@@ -91,25 +138,38 @@ class FreezedNetwork(Network):
         for device in self.topo.values():
             inames = device.inames()
             for iname in inames:
-                collector.biedge(self.id2int[device.id], self.id2int[iname])
+                collector.biedge(self.id2int[device.id], self.id2int[iname], weight=device.weight / 2)
 
         for src, dsts in self.topo.cables.items():
-            collector.biedge(self.id2int[src], *map(self.id2int.get, dsts))
+            for dst in dsts:
+                collector.biedge(self.id2int[src], self.id2int[dst], weight=self.topo.cableWeight(src, dst))
 
         for pod, device in self.binds.items():
             collector.biedge(self.id2int[pod], self.id2int[device])
 
-        podInts = {self.id2int[id] for id in self.pods}
-        types = {k: {self.id2int[p.id] for p in v} for k, v in self.pods.types.items()}
-        for pod, val in self.pods.items():
-            pInt = self.id2int[pod]
-            sameTypes = types.get(val.name)
-            podresult = collector.shortestPaths(pInt, podInts, sameTypes)
-            paths = {k: [LinkPath.aspath(self, tv) for tv in v] for k, v in podresult.items() if k in podInts}
-            for k in podInts:
-                if k not in paths:
-                    paths[k] = []
-            self.paths[pInt] = paths
+        graph = collector.csr()
+        self.graph = graph
+        peak("freeze.nodes", graph.size)
+        peak("freeze.edges", len(graph.indices))
+        self.podInts = {self.id2int[id] for id in self.pods}
+        self.forwarders = (~graph.mask(self.podInts)).tolist()
+        for tpods in self.pods.types.values():
+            sources = [self.id2int[p.id] for p in tpods]
+            for pInt in sources:
+                self.sameTypes[pInt] = sources
+            if self.budget is not None:
+                continue
+            # pods of the same type share the ignored set, so they are solved in one batch
+            table = graph.shortestPaths(sources, self.podInts, sources)
+            for pInt in sources:
+                self.tables[pInt] = table
+        if self.budget is not None:
+            self.cache = ShortestPathCache(self.budget)
+
+    def table(self, source: int) -> ShortestPathTable:
+        if self.cache is None:
+            return self.tables[source]
+        return self.cache.get(source, lambda s: self.graph.shortestPaths([s], self.podInts, self.sameTypes[s]))
 
     def weaks(self):
         return {self.int2id[i] for i in self.weakInts}
@@ -126,6 +186,7 @@ class FreezedNetwork(Network):
             id = port
         assert id in self.id2int
         id = self.id2int[id]
+        self._weakMask = None
         if not ison:
             self.weakInts.add(id)
         elif id in self.weakInts:
@@ -142,20 +203,82 @@ class FreezedNetwork(Network):
     def state(self, source: str, target: str):
         # return a tuple of [healthy paths, weakpaths]
         assert source in self.pods and target in self.pods
-        rawPaths = self.paths[self.id2int[source]][self.id2int[target]]
+        sInt, tInt = self.id2int[source], self.id2int[target]
         healthyPaths: list[LinkPath] = []
         weakPaths: list[LinkPath] = []
-        for path in rawPaths:
+        for nodes in self.table(sInt).paths(sInt, tInt):
+            path = LinkPath.aspath(self, nodes)
             if path.weak():
                 weakPaths.append(path)
             else:
                 healthyPaths.append(path)
         return healthyPaths, weakPaths
 
+    def weakMask(self):
+        if self._weakMask is None:
+            mask = np.zeros(len(self.id2int), dtype=bool)
+            mask[list(self.weakInts)] = True
+            self._weakMask = mask
+        return self._weakMask
+
+    def stateCount(self, source: str, target: str):
+        # return a tuple of [healthy path count, weak path count] without building any path
+        assert source in self.pods and target in self.pods
+        sInt, tInt = self.id2int[source], self.id2int[target]
+        table = self.table(sInt)
+        total = table.pathCount(sInt, tInt)
+        healthy = int(table.blockedCount(self.weakMask())[table.rows[sInt], tInt])
+        return healthy, total - healthy
+
+    def iterState(self, source: str, target: str, weak: bool | None = None, limit: int | None = None) -> Iterator["LinkPath"]:
+        # lazily yield paths, all of them or only healthy (weak=False) / weak (weak=True) ones
+        assert source in self.pods and target in self.pods
+        sInt, tInt = self.id2int[source], self.id2int[target]
+        paths = self.table(sInt).paths(sInt, tInt, self.weakInts, weak)
+        for nodes in islice(paths, limit):
+            yield LinkPath.aspath(self, nodes)
+
+    def kPaths(self, source: str, target: str, k: int):
+        # the k cheapest loopless paths by cable and device costs, cheapest first
+        assert source in self.pods and target in self.pods
+        sInt, tInt = self.id2int[source], self.id2int[target]
+        result: list[LinkPath] = []
+        for cost, nodes in self.graph.kShortestPaths(sInt, tInt, k, self.forwarders, self.sameTypes[sInt]):
+            path = LinkPath.aspath(self, nodes)
+            path.cost = cost
+            result.append(path)
+        return result
+
+    def ecmpState(self, source: str, target: str, k: int, tolerance: float = 1e-9):
+        # return the fractions of traffic on [healthy paths, weak paths]: traffic is split evenly
+        # over the cheapest equal-cost group, and falls back to the next group among the k
+        # cheapest paths only when every path of the current group is weak
+        paths = self.kPaths(source, target, k)
+        if not paths:
+            return 0.0, 0.0
+        groups: list[list[LinkPath]] = []
+        for path in paths:
+            if groups and abs(path.cost - groups[-1][0].cost) <= tolerance:
+                groups[-1].append(path)
+            else:
+                groups.append([path])
+        for group in groups:
+            weak = sum(1 for path in group if path.weak())
+            if weak < len(group):
+                return 1 - weak / len(group), weak / len(group)
+        return 0.0, 1.0
+
+    def hasHealthyPath(self, source: str, target: str):
+        return next(self.iterState(source, target, False, 1), None) is not None
+
+    def hasWeakPath(self, source: str, target: str):
+        return next(self.iterState(source, target, True, 1), None) is not None
+
 
 @dataclass
 class LinkPath(Serializable, list[int]):
     network: FreezedNetwork = field(default_factory=FreezedNetwork)
+    cost: float = 0.0
 
     @classmethod
     def aspath(cls, network: FreezedNetwork, nodes: list[int]):
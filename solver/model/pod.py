@@ -1,19 +1,31 @@
+import sys
 from collections import defaultdict
 from dataclasses import dataclass, field, replace, asdict
 from typing import Iterable
-from rich import print
 from itertools import combinations
 from ..serialization import Serializable
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Pod(Serializable):
     name: str = "pod"
     no: int = 0
+    # formatted once, ids are hashed and compared in every hot loop
+    _id: str = field(default="", init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "name", sys.intern(self.name))
+        object.__setattr__(self, "_id", f"{self.name}-{self.no}")
+
+    def load(self, raw: dict):
+        # frozen: fill the fields in place instead of through setattr
+        object.__setattr__(self, "name", raw.get("name"))
+        object.__setattr__(self, "no", raw.get("no"))
+        self.__post_init__()
 
     @property
     def id(self):
-        return f"{self.name}-{self.no}"
+        return self._id
 
     @classmethod
     def fromId(self, id: str):
@@ -32,12 +44,20 @@ class PodConfig(Serializable):
     major: bool = False
 
 
+class TypeIndex(dict[str, list[Pod]]):
+    # reads of unknown types see no pods without adding them to the index
+    def __missing__(self, key: str):
+        return []
+
+
 @dataclass
 class PodContainer(Serializable, dict[str, Pod]):
     configs: dict[str, PodConfig] = field(
         default_factory=lambda: defaultdict(PodConfig)
     )
     topo: set[tuple[str, str]] = field(default_factory=set)
+    # pods by type, kept up to date by pod() and dropped by any other mutation
+    _types: TypeIndex | None = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         configs = defaultdict(PodConfig)
@@ -47,9 +67,46 @@ class PodContainer(Serializable, dict[str, Pod]):
         self.topo = {(x, y) for x, y in self.topo}
 
     def pod(self, *pods: Pod):
+        types = self._types
         for pod in pods:
             assert pod.id not in self
-            self[pod.id] = pod
+            dict.__setitem__(self, pod.id, pod)
+            if types is not None:
+                if pod.name not in types:
+                    types[pod.name] = []
+                types[pod.name].append(pod)
+
+    def __setitem__(self, key: str, value: Pod):
+        self._types = None
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key: str):
+        self._types = None
+        dict.__delitem__(self, key)
+
+    def pop(self, *args):
+        self._types = None
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._types = None
+        return dict.popitem(self)
+
+    def setdefault(self, key: str, default: Pod):
+        self._types = None
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self._types = None
+        dict.update(self, *args, **kwargs)
+
+    def clear(self):
+        self._types = None
+        dict.clear(self)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
 
     def connect(self, name: str, *others: str):
         for other in others:
@@ -65,16 +122,22 @@ class PodContainer(Serializable, dict[str, Pod]):
 
     @property
     def types(self):
-        types: dict[str, list[Pod]] = defaultdict(list)
-        for pod in self.values():
-            types[pod.name].append(pod)
-        return types
+        # shared with later calls, so callers must not modify the lists
+        if self._types is None:
+            types = TypeIndex()
+            for pod in self.values():
+                if pod.name not in types:
+                    types[pod.name] = []
+                types[pod.name].append(pod)
+            self._types = types
+        return self._types
 
     @property
     def majorTypes(self):
         return {k for k, v in self.configs.items() if v.major}
 
     def display(self):
+        from .summary import print
         types = self.types
         print(f"{len(self)} Pods (in {len(types)} types):")
         for name, pods in types.items():
@@ -86,3 +149,11 @@ class PodContainer(Serializable, dict[str, Pod]):
             print(
                 f"  {nameStr} ({len(pods)}, {reduStr}): {', '.join(pod.id for pod in pods)}"
             )
+
+    def summary(self):
+        from .summary import print
+        from . import summary
+        types = self.types
+        print(f"{len(self)} Pods (in {len(types)} types):")
+        print(summary.types((name, len(pods), self.configs[name].redundancy, self.configs[name].major)
+                            for name, pods in types.items()))
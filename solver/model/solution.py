@@ -2,8 +2,6 @@ from collections import defaultdict
 from dataclasses import dataclass, field
 from .connection import ConnectionState
 from .pod import Pod
-from functools import cached_property
-from rich import print
 from ..serialization import Serializable
 from . import ExecutionStatus
 
@@ -12,8 +10,7 @@ from . import ExecutionStatus
 class Batch(Serializable, list[Pod]):
 
     def coveredConnection(self, state: ConnectionState):
-        podSet = {p.id for p in self}
-        return {(source, target) for source, target in state.pairs if source in podSet or target in podSet}
+        return state.index.covered(p.id for p in self)
 
     def majors(self, state: ConnectionState):
         majors = state.pods.majorTypes
@@ -22,13 +19,17 @@ class Batch(Serializable, list[Pod]):
     def __repr__(self) -> str:
         return f"{{{', '.join(pod.id for pod in self)}}}"
 
-    def display(self, state: ConnectionState):
+    def display(self, state: ConnectionState, covered: int | None = None):
+        # covered may be passed in when the caller has counted it for many batches at once
+        from .summary import print
+        if covered is None:
+            covered = len(self.coveredConnection(state))
         majors = self.majors(state)
         others = {p.id for p in self} - majors
         pods = ", ".join(list(
             f"[bold]{name}[/bold]" for name in majors) + list(f"{name}" for name in others))
         print(f"""  Pods: {pods}
-    include {len(self)} pods ({len(majors)} majors), covered {len(self.coveredConnection(state))} connections""")
+    include {len(self)} pods ({len(majors)} majors), covered {covered} connections""")
 
     def valid(self, state: ConnectionState):
         name2pod = defaultdict(list)
@@ -45,46 +46,82 @@ class Batch(Serializable, list[Pod]):
 class Solution(Serializable, list[Batch]):
     state: ConnectionState = field(default_factory=ConnectionState)
     status: ExecutionStatus = field(default_factory=ExecutionStatus)
+    # whether every solve behind this solution finished, and the worst relative gap / objective bound otherwise
+    optimal: bool = True
+    gap: float = 0.0
+    bound: float | None = None
 
-    @cached_property
+    # recomputed on access through the state's pair index, so they follow later changes to the batches
+    @property
     def coveredConnection(self):
-        result: set[tuple[str, str]] = set()
-        for batch in self:
-            result |= batch.coveredConnection(self.state)
-        return result
+        return self.state.index.covered(self.pods)
 
-    @cached_property
+    @property
     def majors(self):
         result: set[str] = set()
         for batch in self:
             result |= batch.majors(self.state)
         return result
 
-    @cached_property
+    @property
     def pods(self):
         result: set[str] = set()
         for batch in self:
             result |= {p.id for p in batch}
         return result
 
-    @cached_property
+    @property
     def evaluated(self):
         return (len(self.coveredConnection), len(self), len(self.majors), len(self.pods))
 
     def __repr__(self) -> str:
         return f"[{'; '.join(str(batch) for batch in self)}] @ {self.evaluated}"
 
-    def display(self):
+    def displayTotals(self):
+        from .summary import print
         totalPairs = len(self.state.pairs)
         print(f"Solution:")
         print(f"""  {len(self)} batches
   include {len(self.pods)} / {len(self.state.pods)} pods ({len(self.majors)} majors)
   covered {len(self.coveredConnection)} / {totalPairs} connections""")
-        for i, batch in enumerate(self):
+        if self.optimal is False:
+            print(f"  stopped by limit, gap {self.gap:.2%}" + (f", bound {self.bound:.4f}" if self.bound is not None else ""))
+
+    def batchRows(self) -> list[tuple[int, int, int]]:
+        # (covered connections, majors, pods) of every batch, counted together
+        from ..algorithms.evaluate import CoverageEvaluator
+        if not self:
+            return []
+        return [tuple(row) for row in CoverageEvaluator(self.state).batches(self).tolist()]
+
+    def display(self):
+        from .summary import print
+        self.displayTotals()
+        for i, (batch, (covered, _, _)) in enumerate(zip(self, self.batchRows())):
             print(f"Batch {i+1} / {len(self)}:")
-            batch.display(self.state)
+            batch.display(self.state, covered)
         self.status.display()
-        
+
+    def summary(self, top: int = 10):
+        # per-type selections and the batches covering the most, instead of every selected pod
+        from .summary import print
+        from . import summary
+        self.displayTotals()
+        pods = self.state.pods
+        selected: dict[str, int] = defaultdict(int)
+        most: dict[str, int] = defaultdict(int)
+        for batch in self:
+            inBatch: dict[str, int] = defaultdict(int)
+            for pod in batch:
+                inBatch[pod.name] += 1
+            for name, n in inBatch.items():
+                selected[name] += n
+                most[name] = max(most[name], n)
+        print(summary.types(((name, len(members), pods.configs[name].redundancy, pods.configs[name].major,
+                              selected[name], most[name]) for name, members in pods.types.items()), selected=True))
+        print(summary.batches(self.batchRows(), top))
+        self.status.display()
+
 
     def valid(self):
         return all(batch.valid(self.state) for batch in self)
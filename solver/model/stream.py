@@ -0,0 +1,237 @@
+import json
+import sys
+from collections import defaultdict
+from typing import IO, Callable, Iterable, Iterator
+from . import ExecutionStatus
+from .connection import ConnectionState
+from .pod import Pod, PodConfig
+from .solution import Batch, Solution
+
+# JSON Lines layout, one record per line:
+#   {"kind": "state", "configs": ..., "topo": ...}, then "pod" and "weak" records, then {"kind": "end", "status": ...}
+#   {"kind": "solution"}, then "batch" records, then a nested state, then {"kind": "end", "status": ..., "optimal": ...}
+# batches precede the state so that viewers can count covered connections while the weak records stream by
+
+
+def stateRecords(state: ConnectionState) -> Iterator[dict]:
+    yield {"kind": "state", "configs": {k: v.dump() for k, v in state.pods.configs.items()},
+           "topo": sorted(state.pods.topo)}
+    for pod in state.pods.values():
+        yield {"kind": "pod", "name": pod.name, "no": pod.no}
+    for source, targets in state.items():
+        yield {"kind": "weak", "source": source, "targets": targets}
+    yield {"kind": "end", "status": state.status.dump()}
+
+
+def solutionRecords(solution: Solution) -> Iterator[dict]:
+    yield {"kind": "solution"}
+    for batch in solution:
+        yield {"kind": "batch", "pods": [pod.id for pod in batch]}
+    yield from stateRecords(solution.state)
+    yield {"kind": "end", "status": solution.status.dump(),
+           "optimal": solution.optimal, "gap": solution.gap, "bound": solution.bound}
+
+
+def records(data: ConnectionState | Solution) -> Iterator[dict]:
+    return solutionRecords(data) if isinstance(data, Solution) else stateRecords(data)
+
+
+def write(items: Iterable[dict], file: IO[str] | None = None):
+    file = file or sys.stdout
+    for item in items:
+        file.write(json.dumps(item))
+        file.write("\n")
+    file.flush()
+
+
+def read(lines: Iterable[str]) -> Iterator[dict]:
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def load(items: Iterable[dict]) -> ConnectionState | Solution:
+    # build objects record by record; a solution owns the state nested inside it
+    stack: list[ConnectionState | Solution] = []
+    result = None
+    for item in items:
+        kind = item["kind"]
+        if kind == "state":
+            state = ConnectionState()
+            for k, v in item["configs"].items():
+                config = PodConfig()
+                config.load(v)
+                state.pods.configs[k] = config
+            state.pods.topo = {(x, y) for x, y in item["topo"]}
+            if stack:
+                stack[-1].state = state
+            stack.append(state)
+        elif kind == "solution":
+            stack.append(Solution())
+        elif kind == "pod":
+            pod = Pod(item["name"], item["no"])
+            stack[-1].pods[pod.id] = pod
+        elif kind == "weak":
+            stack[-1][item["source"]] = item["targets"]
+        elif kind == "batch":
+            solution = stack[-1]
+            batch = Batch()
+            batch.extend(Pod.fromId(id) for id in item["pods"])
+            solution.append(batch)
+        elif kind == "end":
+            result = stack.pop()
+            status = ExecutionStatus()
+            status.load(item["status"])
+            result.status = status
+            if isinstance(result, Solution):
+                result.optimal, result.gap, result.bound = item["optimal"], item["gap"], item["bound"]
+        else:
+            assert False, f"Unknown record '{kind}'."
+    assert result is not None and not stack, "Incomplete JSON Lines document."
+    return result
+
+
+def relay(items: Iterable[dict], measure: Callable[[ExecutionStatus], ExecutionStatus], file: IO[str] | None = None):
+    # pass records through unchanged, only rewriting the status of the outermost object
+    depth = 0
+    for item in items:
+        kind = item["kind"]
+        if kind in ("state", "solution"):
+            depth += 1
+        elif kind == "end":
+            depth -= 1
+            if depth == 0:
+                inner = ExecutionStatus()
+                inner.load(item["status"])
+                item["status"] = measure(inner).dump()
+        write([item], file)
+
+
+def display(items: Iterable[dict], full: bool = True, top: int = 10):
+    # keeps only the current run of same-typed pods and the selected pod ids in memory;
+    # the summary keeps per-type counts and the degree of every pod instead of printing them
+    from .summary import print
+    from . import summary
+    majors: set[str] = set()
+    configs: dict[str, PodConfig] = defaultdict(PodConfig)
+    inSolution = False
+    batches: list[list[str]] = []
+    # pod id -> indexes of the batches holding it, and the connections each batch covers
+    holders: dict[str, list[int]] = defaultdict(list)
+    batchCovered: list[int] = []
+    covered = 0
+    podCount = 0
+    typeCounts: dict[str, int] = defaultdict(int)
+    pairCount = 0
+    run: list[str] = []
+    runName = None
+    # summary aggregates
+    nameOf: dict[str, str] = {}
+    degrees: dict[str, int] = {}
+    pairCounts: dict[tuple[str, str], int] = defaultdict(int)
+
+    def flush():
+        nonlocal runName
+        if runName is not None and not inSolution and full:
+            config = configs[runName]
+            nameStr = f"[bold]{runName}[/bold]" if config.major else f"{runName}"
+            reduStr = f"<={config.redundancy}" if config.redundancy is not None else "N/A"
+            print(f"  {nameStr} ({len(run)}, {reduStr}): {', '.join(run)}")
+        run.clear()
+        runName = None
+
+    def typeRows():
+        return ((name, n, configs[name].redundancy, configs[name].major) for name, n in typeCounts.items())
+
+    for item in items:
+        kind = item["kind"]
+        if kind == "solution":
+            inSolution = True
+        elif kind == "batch":
+            for id in item["pods"]:
+                holders[id].append(len(batches))
+            batches.append(item["pods"])
+            batchCovered.append(0)
+        elif kind == "state":
+            for k, v in item["configs"].items():
+                config = PodConfig()
+                config.load(v)
+                configs[k] = config
+            majors = {k for k, v in configs.items() if v.major}
+            if not inSolution and full:
+                print("Pods:")
+        elif kind == "pod":
+            if item["name"] != runName:
+                flush()
+                runName = item["name"]
+            id = f"{item['name']}-{item['no']}"
+            if full:
+                run.append(id)
+            else:
+                nameOf[id] = item["name"]
+                degrees[id] = 0
+            typeCounts[item["name"]] += 1
+            podCount += 1
+        elif kind == "weak":
+            flush()
+            source, targets = item["source"], item["targets"]
+            pairCount += len(targets)
+            if inSolution:
+                for target in targets:
+                    hit = set(holders.get(source, ())) | set(holders.get(target, ()))
+                    for b in hit:
+                        batchCovered[b] += 1
+                    covered += bool(hit)
+            elif full:
+                print(f"  {source} -> {', '.join(targets)}")
+            else:
+                sourceName = nameOf.get(source) or Pod.fromId(source).name
+                degrees[source] = degrees.get(source, 0) + len(targets)
+                for target in targets:
+                    pairCounts[(sourceName, nameOf.get(target) or Pod.fromId(target).name)] += 1
+                    degrees[target] = degrees.get(target, 0) + 1
+        elif kind == "end":
+            flush()
+            status = ExecutionStatus()
+            status.load(item["status"])
+            if "optimal" in item:
+                selected = set(holders)
+                print(f"Solution:")
+                print(f"""  {len(batches)} batches
+  include {len(selected)} / {podCount} pods ({sum(1 for id in selected if id.split('-', 1)[0] in majors)} majors)
+  covered {covered} / {pairCount} connections""")
+                if item["optimal"] is False:
+                    print(f"  stopped by limit, gap {item['gap']:.2%}" +
+                          (f", bound {item['bound']:.4f}" if item["bound"] is not None else ""))
+                if full:
+                    for i, pods in enumerate(batches):
+                        majorIds = [id for id in pods if id.split('-', 1)[0] in majors]
+                        podStr = ", ".join([f"[bold]{id}[/bold]" for id in majorIds] + [id for id in pods if id not in majorIds])
+                        print(f"Batch {i+1} / {len(batches)}:")
+                        print(f"""  Pods: {podStr}
+    include {len(pods)} pods ({len(majorIds)} majors), covered {batchCovered[i]} connections""")
+                else:
+                    rows, selectedCounts, most = [], defaultdict(int), defaultdict(int)
+                    for i, pods in enumerate(batches):
+                        inBatch: dict[str, int] = defaultdict(int)
+                        for id in pods:
+                            inBatch[Pod.fromId(id).name] += 1
+                        for name, n in inBatch.items():
+                            selectedCounts[name] += n
+                            most[name] = max(most[name], n)
+                        rows.append((batchCovered[i], sum(n for name, n in inBatch.items() if name in majors), len(pods)))
+                    print(summary.types(((*row, selectedCounts[row[0]], most[row[0]]) for row in typeRows()), selected=True))
+                    print(summary.batches(rows, top))
+                status.display()
+            elif not inSolution:
+                if full:
+                    print(f"{podCount} Pods (in {len(typeCounts)} types), {pairCount} Weak Connections")
+                else:
+                    print(f"{podCount} Pods (in {len(typeCounts)} types):")
+                    print(summary.types(typeRows()))
+                    print(f"{pairCount} Weak Connections:")
+                    print(summary.pairs(pairCounts, top))
+                    print(summary.ranking("Most connected pods", degrees.items(), top, "connections"))
+                    print(summary.histogram("Connections per pod", degrees.values()))
+                status.display()
@@ -0,0 +1,105 @@
+import re
+import sys
+from dataclasses import dataclass, field
+from heapq import nlargest, nsmallest
+from typing import Iterable
+
+# renderers of the model views, fed with aggregates that the callers collect in one pass over their data;
+# they write plain text with [bold] markup only, so the viewer commands never load rich
+MARKUP = re.compile(r"\[(/?)bold\]")
+
+
+def plain(text: str):
+    return MARKUP.sub("", text)
+
+
+@dataclass
+class Table:
+    columns: list[str]
+    title: str = ""
+    caption: str = ""
+    rows: list[list[str]] = field(default_factory=list)
+
+    def add_column(self, name: str):
+        self.columns.append(name)
+
+    def add_row(self, *cells: str):
+        self.rows.append(list(cells))
+
+    def __str__(self):
+        widths = [max(len(plain(row[i])) for row in (self.columns, *self.rows)) for i in range(len(self.columns))]
+
+        def line(cells: list[str]):
+            return "  ".join(cell + " " * (w - len(plain(cell))) for cell, w in zip(cells, widths)).rstrip()
+        lines = [self.title, line(self.columns), line(["-" * w for w in widths])] + [line(row) for row in self.rows]
+        if self.caption:
+            lines.append(self.caption)
+        return "\n".join(lines)
+
+
+def print(*objects):
+    # markup turns bold on a terminal and is dropped elsewhere, as rich's print would do
+    text = " ".join(map(str, objects))
+    if sys.stdout.isatty():
+        text = MARKUP.sub(lambda m: "\x1b[22m" if m.group(1) else "\x1b[1m", text)
+    else:
+        text = plain(text)
+    sys.stdout.write(text + "\n")
+
+
+def types(rows: Iterable[tuple], selected: bool = False) -> Table:
+    # rows of (name, pods, redundancy, major) and, with selected, (selected pods, most in one batch)
+    table = Table(["type", "pods", "redundancy", "major"], "Pod types")
+    if selected:
+        table.add_column("selected")
+        table.add_column("max / batch")
+    for name, count, redundancy, major, *rest in rows:
+        cells = [f"[bold]{name}[/bold]" if major else name, str(count),
+                 f"<={redundancy}" if redundancy is not None else "N/A", "yes" if major else ""]
+        table.add_row(*cells, *map(str, rest))
+    return table
+
+
+def pairs(counts: dict[tuple[str, str], int], top: int) -> Table:
+    total = sum(counts.values())
+    table = Table(["source", "target", "connections", "share"], "Weak connections by type")
+    # ties are broken by name, so the same data always renders the same rows
+    for (source, target), n in nsmallest(top, counts.items(), key=lambda item: (-item[1], item[0])):
+        table.add_row(source, target, str(n), f"{n / total:.1%}" if total else "")
+    if len(counts) > top:
+        table.caption = f"... {len(counts) - top} more type pairs"
+    return table
+
+
+def ranking(title: str, items: Iterable[tuple[str, int]], top: int, column: str) -> Table:
+    table = Table(["#", "pod", column], title)
+    for i, (id, n) in enumerate(nsmallest(top, items, key=lambda item: (-item[1], item[0]))):
+        table.add_row(str(i + 1), id, str(n))
+    return table
+
+
+def histogram(title: str, values: Iterable[int], width: int = 40) -> Table:
+    # power-of-two buckets: 0, 1, 2-3, 4-7, ...
+    buckets: dict[int, int] = {}
+    for v in values:
+        b = v.bit_length()
+        buckets[b] = buckets.get(b, 0) + 1
+    table = Table(["range", "count", ""], title)
+    most = max(buckets.values(), default=0)
+    for b in range(min(buckets, default=0), max(buckets, default=-1) + 1):
+        n = buckets.get(b, 0)
+        label = str(b) if b < 2 else f"{1 << (b - 1)}-{(1 << b) - 1}"
+        table.add_row(label, str(n), "#" * (round(width * n / most) if most else 0))
+    return table
+
+
+def batches(rows: list[tuple[int, int, int]], top: int) -> Table:
+    # rows of (covered connections, majors, pods) in batch order, listing the batches covering the most
+    table = Table(["batch", "pods", "majors", "covered"], "Batches")
+    order = nlargest(top, range(len(rows)), key=lambda i: rows[i][0])
+    for i in sorted(order):
+        covered, majors, pods = rows[i]
+        table.add_row(f"{i + 1} / {len(rows)}", str(pods), str(majors), str(covered))
+    if len(rows) > top:
+        table.caption = f"... {len(rows) - top} more batches covering less"
+    return table
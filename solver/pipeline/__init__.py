@@ -0,0 +1,164 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator
+from rich import print
+from ..model import ExecutionStatus
+from ..serialization import Serializable
+
+
+class StageError(Exception):
+    pass
+
+
+@dataclass
+class CaseResult(Serializable):
+    name: str = ""
+    index: int = 0
+    attempts: int = 0
+    error: str = ""
+    wallClock: float = 0
+    status: ExecutionStatus = field(default_factory=ExecutionStatus)
+
+    @property
+    def ok(self):
+        return not self.error
+
+
+@dataclass
+class Summary:
+    # the aggregates of one scenario written to result.json, averaged over the succeeded cases
+    total: int = 0
+    failed: int = 0
+    cpuPercent: float = 0
+    wallClock: float = 0
+    maxWallClock: float = 0
+    maxResidentSize: float = 0
+    phases: dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    counters: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    def add(self, result: CaseResult):
+        self.total += 1
+        if not result.ok:
+            self.failed += 1
+            return
+        status = result.status
+        self.cpuPercent += status.cpuPercent
+        self.wallClock += status.wallClock
+        self.maxResidentSize += status.maxResidentSize
+        self.maxWallClock = max(self.maxWallClock, status.wallClock)
+        for k, v in status.phases.items():
+            self.phases[k] += v
+        for k, v in status.counters.items():
+            self.counters[k] += v
+
+    @property
+    def succeeded(self):
+        return max(1, self.total - self.failed)
+
+    def dump(self):
+        succeeded = self.succeeded
+        return {
+            "avgTime": self.wallClock / succeeded,
+            "maxTime": self.maxWallClock,
+            "cpu": self.cpuPercent / succeeded,
+            "memory": self.maxResidentSize / succeeded / 1024,
+            "failed": self.failed,
+            "phases": {k: v / succeeded for k, v in self.phases.items()},
+            "counters": {k: v / succeeded for k, v in self.counters.items()},
+        }
+
+    def display(self):
+        succeeded = self.succeeded
+        print(f"""
+time  : (avg) {self.wallClock / succeeded :.4f} s / (max) {self.maxWallClock :.4f} s
+cpu   : {self.cpuPercent / succeeded} %
+memory: {self.maxResidentSize / succeeded / 1024 :.4f} MB
+failed: {self.failed} / {self.total}
+""".strip())
+        for k, v in self.phases.items():
+            print(f"phase {k}: (avg) {v / succeeded :.4f} s")
+        for k, v in self.counters.items():
+            print(f"count {k}: (avg) {v / succeeded :.2f}")
+
+    def write(self, path: Path):
+        os.makedirs(path.parent, exist_ok=True)
+        path.write_text(json.dumps(self.dump()))
+
+
+@dataclass
+class Pipeline:
+    concurrency: int = os.cpu_count() or 1
+    generateTimeout: float = 600
+    solveTimeout: float = 600
+    retries: int = 3
+    root: Path = Path("./logs")
+    tests: Path = Path("./tests")
+    bugs: Path = Path("./bug")
+
+    async def stage(self, semaphore: asyncio.Semaphore, timeout: float, target: Path, *args: str):
+        # run one `python -m solver ...` stage, writing stdout to target only when it succeeds
+        partial = target.with_name(target.name + ".part")
+        async with semaphore:
+            with partial.open("wb") as f:
+                proc = await asyncio.create_subprocess_exec(
+                    sys.executable, "-m", "solver", *args, stdout=f, stderr=asyncio.subprocess.PIPE)
+                try:
+                    _, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    proc.kill()
+                    await proc.wait()
+                    raise
+        if proc.returncode != 0:
+            raise StageError(f"{args[0]} exited with {proc.returncode}: {stderr.decode(errors='replace').strip()[-500:]}")
+        partial.replace(target)
+
+    async def case(self, semaphore: asyncio.Semaphore, name: str, index: int, seed: int | None = None):
+        targetDir = self.root / name
+        fState = targetDir / f"{index}.json"
+        fSolution = targetDir / f"{index}_sol.json"
+        result = CaseResult(name, index)
+        start = time.perf_counter()
+        while result.attempts < self.retries:
+            result.attempts += 1
+            try:
+                await self.stage(semaphore, self.generateTimeout, fState,
+                                 "generate", str((self.tests / f"{name}.py").resolve()),
+                                 *(() if seed is None else ("--seed", str(seed))))
+                await self.stage(semaphore, self.solveTimeout, fSolution,
+                                 "solve", str(fState.resolve()))
+                result.error = ""
+                break
+            except (StageError, asyncio.TimeoutError) as ex:
+                result.error = repr(ex)
+                if fState.exists():
+                    bugfile = self.bugs / f"{name}_{index}_{int(datetime.now().timestamp())}.json"
+                    os.makedirs(bugfile.parent, exist_ok=True)
+                    bugfile.write_bytes(fState.read_bytes())
+        result.wallClock = time.perf_counter() - start
+        if result.ok:
+            from ..model.solution import Solution
+            data = Solution()
+            data.load(json.loads(fSolution.read_text()))
+            result.status = data.status
+        return result
+
+    async def run(self, cases: list[tuple[str, int]]) -> AsyncIterator[CaseResult]:
+        # yield case results as they complete; leaving early cancels the rest
+        semaphore = asyncio.Semaphore(self.concurrency)
+        for name in {name for name, _ in cases}:
+            os.makedirs(self.root / name, exist_ok=True)
+        tasks = [asyncio.create_task(self.case(semaphore, name, index)) for name, index in cases]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
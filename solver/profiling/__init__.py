@@ -0,0 +1,59 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Profiler:
+    # accumulated wall-clock seconds per phase, and counters (sums or peaks)
+    phases: dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    counters: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    # counters recorded with peak(), merged by maximum instead of by sum
+    peaks: set[str] = field(default_factory=set)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def peak(self, name: str, value: int):
+        self.peaks.add(name)
+        self.counters[name] = max(self.counters[name], value)
+
+    def snapshot(self) -> dict:
+        # a picklable copy, shipped back from worker processes along with their results
+        return {"phases": dict(self.phases), "counters": dict(self.counters), "peaks": sorted(self.peaks)}
+
+    def merge(self, snapshot: dict):
+        # phases of workers running side by side add up to more than the wall-clock time of the caller
+        for name, seconds in snapshot["phases"].items():
+            self.phases[name] += seconds
+        self.peaks.update(snapshot["peaks"])
+        for name, value in snapshot["counters"].items():
+            if name in self.peaks:
+                self.peak(name, value)
+            else:
+                self.count(name, value)
+
+    def annotate(self, status):
+        status.phases.update(self.phases)
+        status.counters.update(self.counters)
+        return status
+
+    def reset(self):
+        self.phases.clear()
+        self.counters.clear()
+        self.peaks.clear()
+
+
+profiler = Profiler()
+phase = profiler.phase
+count = profiler.count
+peak = profiler.peak
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from rich import print
+from ..model import ExecutionStatus
+from ..pipeline import CaseResult, Pipeline, Summary
+
+# one row per (scenario, index); a claim leases the row to a worker until `leaseUntil`,
+# a lease that runs out without completion puts the job back for the next claim
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    name TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    seed INTEGER,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    leaseUntil REAL,
+    error TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    PRIMARY KEY (name, idx)
+);
+CREATE INDEX IF NOT EXISTS jobsState ON jobs (state, leaseUntil);
+"""
+
+
+@dataclass
+class Job:
+    name: str
+    index: int
+    seed: int | None
+    attempts: int
+    worker: str
+
+
+@dataclass
+class JobQueue:
+    # a job queue in one SQLite file on storage shared by every worker
+    path: Path
+    # seconds a claim stays valid without a renewal
+    lease: float = 120
+    # claims of a job before it is failed for good
+    attempts: int = 3
+    timeout: float = 60
+
+    @contextmanager
+    def transaction(self):
+        # the rollback journal works over network file systems, unlike WAL
+        with closing(sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def init(self):
+        os.makedirs(self.path.parent, exist_ok=True)
+        with closing(sqlite3.connect(self.path, timeout=self.timeout)) as db:
+            db.executescript(SCHEMA)
+
+    def enqueue(self, name: str, limit: int, seed: int | None = None):
+        # jobs 1..limit of a scenario, seeded with seed + index; existing jobs are kept
+        with self.transaction() as db:
+            cursor = db.executemany("INSERT OR IGNORE INTO jobs (name, idx, seed) VALUES (?, ?, ?)",
+                                    [(name, i + 1, None if seed is None else seed + i + 1) for i in range(limit)])
+            return cursor.rowcount
+
+    def claim(self, worker: str) -> Job | None:
+        now = time.time()
+        with self.transaction() as db:
+            # running jobs whose lease ran out on their last attempt are given up
+            db.execute("UPDATE jobs SET state = 'failed', error = 'lease expired' "
+                       "WHERE state = 'running' AND leaseUntil < ? AND attempts >= ?", (now, self.attempts))
+            row = db.execute("SELECT name, idx, seed, attempts FROM jobs "
+                             "WHERE state = 'pending' OR (state = 'running' AND leaseUntil < ?) "
+                             "ORDER BY attempts, name, idx LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            name, index, seed, attempts = row
+            db.execute("UPDATE jobs SET state = 'running', attempts = ?, worker = ?, leaseUntil = ? "
+                       "WHERE name = ? AND idx = ?", (attempts + 1, worker, now + self.lease, name, index))
+        return Job(name, index, seed, attempts + 1, worker)
+
+    def owned(self, db: sqlite3.Connection, job: Job, sql: str, *args):
+        # only the worker holding the current claim may touch the job
+        cursor = db.execute(sql + " WHERE name = ? AND idx = ? AND state = 'running' AND worker = ? AND attempts = ?",
+                            (*args, job.name, job.index, job.worker, job.attempts))
+        return cursor.rowcount == 1
+
+    def renew(self, job: Job) -> bool:
+        with self.transaction() as db:
+            return self.owned(db, job, "UPDATE jobs SET leaseUntil = ?", time.time() + self.lease)
+
+    def complete(self, job: Job, result: CaseResult) -> bool:
+        with self.transaction() as db:
+            return self.owned(db, job, "UPDATE jobs SET state = 'done', error = '', result = ?",
+                              json.dumps(result.status.dump()))
+
+    def fail(self, job: Job, error: str) -> bool:
+        # back to pending while attempts are left
+        state = "failed" if job.attempts >= self.attempts else "pending"
+        with self.transaction() as db:
+            return self.owned(db, job, "UPDATE jobs SET state = ?, error = ?", state, error)
+
+    def reset(self, name: str | None = None):
+        # give failed jobs a fresh set of attempts
+        with self.transaction() as db:
+            db.execute("UPDATE jobs SET state = 'pending', attempts = 0, error = '' "
+                       "WHERE state = 'failed' AND (? IS NULL OR name = ?)", (name, name))
+
+    def counts(self) -> dict[str, dict[str, int]]:
+        with self.transaction() as db:
+            rows = db.execute("SELECT name, state, COUNT(*) FROM jobs GROUP BY name, state").fetchall()
+        result: dict[str, dict[str, int]] = {}
+        for name, state, n in rows:
+            result.setdefault(name, {})[state] = n
+        return result
+
+    def results(self, name: str) -> list[CaseResult]:
+        # settled jobs of a scenario, leaving out the ones still pending or running
+        with self.transaction() as db:
+            rows = db.execute("SELECT idx, attempts, state, error, result FROM jobs "
+                              "WHERE name = ? AND state IN ('done', 'failed') ORDER BY idx", (name,)).fetchall()
+        results = []
+        for index, attempts, state, error, data in rows:
+            result = CaseResult(name, index, attempts, error or ("failed" if state == "failed" else ""))
+            if data is not None:
+                result.status = ExecutionStatus()
+                result.status.load(json.loads(data))
+            results.append(result)
+        return results
+
+
+@dataclass
+class Worker:
+    # claims jobs until the queue has none left, running each one through the pipeline stages
+    queue: JobQueue
+    pipeline: Pipeline = field(default_factory=Pipeline)
+    name: str = field(default_factory=lambda: f"{socket.gethostname()}:{os.getpid()}")
+
+    async def heartbeat(self, job: Job):
+        while True:
+            await asyncio.sleep(self.queue.lease / 3)
+            await asyncio.to_thread(self.queue.renew, job)
+
+    async def loop(self, semaphore: asyncio.Semaphore, slot: int):
+        worker = f"{self.name}/{slot}"
+        while (job := await asyncio.to_thread(self.queue.claim, worker)) is not None:
+            print(f"{worker}: {job.name} {job.index} (attempt {job.attempts})")
+            os.makedirs(self.pipeline.root / job.name, exist_ok=True)
+            heartbeat = asyncio.create_task(self.heartbeat(job))
+            try:
+                result = await self.pipeline.case(semaphore, job.name, job.index, job.seed)
+            finally:
+                heartbeat.cancel()
+            if result.ok:
+                kept = await asyncio.to_thread(self.queue.complete, job, result)
+            else:
+                print(f"Fail: {job.index} for {job.name}: {result.error}")
+                kept = await asyncio.to_thread(self.queue.fail, job, result.error)
+            if not kept:
+                print(f"{worker}: lost the lease of {job.name} {job.index}")
+
+    async def run(self):
+        # the queue owns retries, so that a failed attempt moves on to any worker
+        self.pipeline.retries = 1
+        semaphore = asyncio.Semaphore(self.pipeline.concurrency)
+        await asyncio.gather(*(self.loop(semaphore, slot) for slot in range(self.pipeline.concurrency)))
+
+
+def collect(queue: JobQueue, root: Path = Path("./logs")):
+    # merge the per-job metrics of every scenario into its result.json
+    for name, counts in sorted(queue.counts().items()):
+        summary = Summary()
+        for result in queue.results(name):
+            summary.add(result)
+        print(f"----- {name} -----")
+        left = sum(v for k, v in counts.items() if k not in ("done", "failed"))
+        if left:
+            print(f"{left} jobs not settled yet")
+        summary.display()
+        summary.write(root / name / "result.json")
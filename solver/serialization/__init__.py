@@ -53,6 +53,9 @@ def loadValue(raw: dict | list | object):
 
 
 class Serializable:
+    # no instance dict of its own, so slotted subclasses stay compact
+    __slots__ = ()
+
     def dump(self) -> dict:
         result = {}
         for field in dataclasses.fields(self):
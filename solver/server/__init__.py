@@ -0,0 +1,233 @@
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ..profiling import Profiler
+
+
+def warmup():
+    # load pyomo and the solver stack once per worker process
+    from ..solver import CIPMultipleBatchSolver  # noqa: F401
+    import pyomo.environ  # noqa: F401
+
+
+def solvePayload(payload: dict):
+    from ..model.connection import ConnectionState
+    from ..solver import CIPMultipleBatchSolver
+    from ..profiling import profiler
+
+    profiler.reset()
+    state = ConnectionState()
+    try:
+        state.load(payload)
+    except (AssertionError, AttributeError, KeyError, TypeError, ValueError) as ex:
+        raise BadRequest(f"Invalid state: {ex!r}") from None
+    solution = CIPMultipleBatchSolver().solve(state)
+    profiler.annotate(solution.status)
+    return solution.dump(), profiler.snapshot()
+
+
+class Overloaded(Exception):
+    pass
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class NotFound(KeyError):
+    pass
+
+
+@dataclass
+class SolveService:
+    workers: int = max(1, (os.cpu_count() or 1) // 2)
+    maxQueue: int = 64
+    window: int = 1024
+    pool: ProcessPoolExecutor | None = field(default=None, init=False)
+    pending: int = field(default=0, init=False)
+    completed: int = field(default=0, init=False)
+    failed: int = field(default=0, init=False)
+    rejected: int = field(default=0, init=False)
+    # client errors, answered with 400 and counted neither as completed nor as failed
+    invalid: int = field(default=0, init=False)
+    latencies: deque[float] = field(default_factory=deque, init=False)
+    # phases and counters of every solve, merged from the worker processes
+    profile: Profiler = field(default_factory=Profiler, init=False)
+    networks: dict[str, object] = field(default_factory=dict, init=False)
+    networkLocks: dict[str, threading.Lock] = field(default_factory=dict, init=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def start(self):
+        self.pool = ProcessPoolExecutor(self.workers, initializer=warmup)
+        self.latencies = deque(maxlen=self.window)
+        return self
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def submit(self, payload: dict) -> Future:
+        assert self.pool is not None, "Service is not started."
+        with self.lock:
+            if self.pending >= self.maxQueue:
+                self.rejected += 1
+                raise Overloaded(f"{self.pending} requests pending")
+            self.pending += 1
+        start = time.perf_counter()
+        future = self.pool.submit(solvePayload, payload)
+
+        def done(f: Future):
+            with self.lock:
+                self.pending -= 1
+                if not f.cancelled() and f.exception() is None:
+                    self.completed += 1
+                    self.latencies.append(time.perf_counter() - start)
+                    self.profile.merge(f.result()[1])
+                elif f.cancelled() or not isinstance(f.exception(), BadRequest):
+                    self.failed += 1
+        future.add_done_callback(done)
+        return future
+
+    def solve(self, payloads: list[dict]):
+        # submit the whole batch before waiting, so its states run side by side on the pool
+        futures = [self.submit(payload) for payload in payloads]
+        return [f.result()[0] for f in futures]
+
+    def register(self, name: str, payload: dict):
+        from ..model.network import Network
+        network = Network()
+        network.load(payload)
+        frozen = network.freeze()
+        with self.lock:
+            self.networks[name] = frozen
+            self.networkLocks[name] = threading.Lock()
+
+    def generate(self, name: str, off: list[str]):
+        from ..generator import ProbabilityConnectionStateGenerator
+        if name not in self.networks:
+            raise NotFound(f"Network '{name}' not found")
+        network = self.networks[name]
+        with self.networkLocks[name]:
+            network.on(*network.weaks())
+            network.off(*off)
+            generator = ProbabilityConnectionStateGenerator.fromNetwork(network)
+        return generator.generate().dump()
+
+    def metrics(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+
+            def percentile(p: float):
+                if not latencies:
+                    return 0.0
+                return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+            return {
+                "workers": self.workers,
+                "queueDepth": self.pending,
+                "maxQueue": self.maxQueue,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "invalid": self.invalid,
+                "networks": sorted(self.networks.keys()),
+                "latency": {f"p{p}": percentile(p) for p in (50, 90, 95, 99)},
+                "phases": dict(self.profile.phases),
+                "counters": dict(self.profile.counters),
+            }
+
+
+class SolveHandler(BaseHTTPRequestHandler):
+    service: SolveService
+
+    def address_string(self):
+        # unix sockets have no peer address
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def reply(self, code: int, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def payload(self, kind: type = dict, optional: bool = False):
+        # the JSON body, checked to be of kind before anything is dispatched
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            data = json.loads(self.rfile.read(length) or b"null")
+        except ValueError as ex:
+            raise BadRequest(f"Invalid JSON: {ex}") from None
+        if data is None and optional:
+            return kind()
+        if not isinstance(data, kind):
+            raise BadRequest(f"Body must be a JSON {'object' if kind is dict else 'array'}.")
+        return data
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self.reply(200, self.service.metrics())
+        else:
+            self.reply(404, {"error": f"Unknown path '{self.path}'"})
+
+    def do_POST(self):
+        parts = [p for p in self.path.split("/") if p]
+        try:
+            if parts == ["solve"]:
+                self.reply(200, self.service.solve([self.payload()])[0])
+            elif parts == ["solve", "batch"]:
+                payloads = self.payload(list)
+                if not all(isinstance(payload, dict) for payload in payloads):
+                    raise BadRequest("Batch must be a list of state objects.")
+                self.reply(200, self.service.solve(payloads))
+            elif len(parts) == 2 and parts[0] == "networks":
+                self.service.register(parts[1], self.payload())
+                self.reply(200, {"network": parts[1]})
+            elif len(parts) == 3 and parts[0] == "networks" and parts[2] in ("state", "solve"):
+                off = self.payload(optional=True).get("off", [])
+                if not isinstance(off, list) or not all(isinstance(port, str) for port in off):
+                    raise BadRequest("'off' must be a list of port names.")
+                state = self.service.generate(parts[1], off)
+                self.reply(200, state if parts[2] == "state" else self.service.solve([state])[0])
+            else:
+                self.reply(404, {"error": f"Unknown path '{self.path}'"})
+        except Overloaded as ex:
+            self.reply(503, {"error": str(ex)})
+        except NotFound as ex:
+            self.reply(404, {"error": ex.args[0]})
+        except (AssertionError, ValueError, KeyError) as ex:
+            with self.service.lock:
+                self.service.invalid += 1
+            self.reply(400, {"error": str(ex) if isinstance(ex, BadRequest) else repr(ex)})
+        except Exception as ex:
+            self.reply(500, {"error": repr(ex)})
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def bind(service: SolveService, host: str = "127.0.0.1", port: int = 8000, socket: str | None = None):
+    handler = type("BoundSolveHandler", (SolveHandler,), {"service": service})
+    if socket is not None:
+        if os.path.exists(socket):
+            os.remove(socket)
+        return ThreadingUnixHTTPServer(socket, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(service: SolveService, host: str = "127.0.0.1", port: int = 8000, socket: str | None = None):
+    server = bind(service, host, port, socket)
+    service.start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.stop()
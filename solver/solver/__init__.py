@@ -6,8 +6,19 @@ from ..model.pod import Pod, PodContainer
 from ..model.solution import Solution, Batch
 from abc import ABC, abstractmethod
 from rich import print
-from math import ceil
-from ..algorithms.cip import CIPSolver
+from math import ceil, log2
+from concurrent.futures import Future, ProcessPoolExecutor
+import os
+import signal
+import time
+from typing import TYPE_CHECKING
+from ..profiling import phase, count, peak, profiler
+from ..serialization import Serializable
+
+# pyomo takes hundreds of milliseconds to import, so the modules building models load on the first solve
+if TYPE_CHECKING:
+    import multiprocessing
+    import pyomo.environ as pyo
 
 
 class Solver(ABC):
@@ -21,22 +32,100 @@ class CIPSingleBatchSolver(Solver):
     C1: float = 1000.0
     C3: float = 10.0
     C4: float = 1.0
+    timeLimit: float | None = None
+    gap: float | None = None
+    # drop isolated pods and aggregate interchangeable ones before building the model
+    presolve: bool = False
 
-    def solve(self, state: ConnectionState) -> Solution:
-        pods = CIPSolver(state).compile(self.C1, self.C3, self.C4).solve()
+    def solve(self, state: ConnectionState, timeLimit: float | None = None) -> Solution:
+        # timeLimit overrides the configured limit for this call, e.g. to respect an outer deadline
+        if timeLimit is None:
+            timeLimit = self.timeLimit
+        elif self.timeLimit is not None:
+            timeLimit = min(timeLimit, self.timeLimit)
+        from ..algorithms.cip import CIPSolver
+        cip = CIPSolver(state).compile(self.C1, self.C3, self.C4, presolve=self.presolve)
+        pods = cip.solve(timeLimit, self.gap)
         batch = Batch()
         batch.extend(pods)
-        result = Solution(state=state)
+        result = Solution(state=state, optimal=cip.optimal, gap=cip.gap, bound=cip.bound)
         result.append(batch)
         return result
 
 
+def scaleRedundancy(state: ConnectionState, k: int):
+    stateK: ConnectionState = state.copy()
+    for config in stateK.pods.configs.values():
+        if config.redundancy != None:
+            config.redundancy *= k
+    return stateK
+
+
+def solveKBatchTask(solver: CIPSingleBatchSolver, state: ConnectionState, k: int, timeLimit: float | None):
+    # runs in a worker process; only the selected pod ids and the profile of this solve travel back
+    profiler.reset()
+    solution = solver.solve(scaleRedundancy(state, k), timeLimit)
+    return [p.id for p in solution[0]], solution.optimal, solution.gap, solution.bound, profiler.snapshot()
+
+
+def isolate(pids: "multiprocessing.SimpleQueue"):
+    # each worker leads its own process group, so that stopping it also stops the SCIP process it runs,
+    # and reports its pid, as the executor keeps its processes private
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    pids.put(os.getpid())
+
+
+def stopPool(pool: ProcessPoolExecutor, pids: "multiprocessing.SimpleQueue"):
+    # abandon the queued work and kill the workers still solving, instead of waiting for them
+    pool.shutdown(wait=False, cancel_futures=True)
+    while not pids.empty():
+        pid = pids.get()
+        try:
+            os.killpg(pid, signal.SIGTERM) if hasattr(os, "killpg") else os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def coverable(state: ConnectionState):
+    # connections with an end whose type may be selected at all
+    blocked = {name for name, config in state.pods.configs.items() if config.redundancy == 0}
+    return sum(1 for source, target in state.pairs
+               if state.pods[source].name not in blocked or state.pods[target].name not in blocked)
+
+
+def searchTree(batchL: int, batchR: int, depth: int):
+    # the batch counts the sequential binary search may probe in its next depth steps
+    result: list[int] = []
+    level = [(batchL, batchR)]
+    for _ in range(depth):
+        nexts = []
+        for l, r in level:
+            if l > r:
+                continue
+            mid = (l + r) // 2
+            result.append(mid)
+            nexts += [(l, mid - 1), (mid + 1, r)]
+        level = nexts
+    return result
+
+
 @dataclass
 class CIPMultipleBatchSolver(Solver):
     C1: float = 1000.0
     C2: float = 100.0
     C3: float = 10.0
     C4: float = 1.0
+    # limits for every SCIP call, and an overall budget for the whole binary search
+    timeLimit: float | None = None
+    gap: float | None = None
+    deadline: float | None = None
+    # with more than one worker, upcoming binary-search steps are solved speculatively in parallel
+    workers: int = 1
+    # how selected pods are split into batches: "greedy" (type by type, as splitBatch always did), or the
+    # opt-in "balanced" and "exact" partitions
+    partition: str = "greedy"
+    presolve: bool = False
 
     def splitBatch(self, state: ConnectionState, batch: Batch):
         batches: list[Batch] = []
@@ -69,22 +158,80 @@ class CIPMultipleBatchSolver(Solver):
 
         return batches
 
+    def partitionBatch(self, state: ConnectionState, batch: Batch, batchCount: int):
+        if self.partition == "greedy" or not batch:
+            return self.splitBatch(state, batch)
+        # the greedy split fixes how many batches the selected pods need
+        batchCount = min(batchCount, len(self.splitBatch(state, batch)))
+        from ..algorithms.partition import BatchPartitioner
+        partitioner = BatchPartitioner(state)
+        if self.partition == "exact":
+            return partitioner.exact(list(batch), batchCount, self.timeLimit)
+        assert self.partition == "balanced", f"Unknown partition '{self.partition}'."
+        return partitioner.balanced(list(batch), batchCount)
+
     def solve(self, state: ConnectionState) -> Solution:
         totalWeak = len(state.pairs)
         if totalWeak == 0:
             return Solution(state)
 
-        singleSolver = CIPSingleBatchSolver(self.C1, self.C3, self.C4)
+        singleSolver = CIPSingleBatchSolver(self.C1, self.C3, self.C4, self.timeLimit, self.gap, self.presolve)
+        start = time.perf_counter()
+
+        def remaining():
+            if self.deadline is None:
+                return None
+            return self.deadline - (time.perf_counter() - start)
+
+        pool = pids = None
+        if self.workers > 1:
+            import multiprocessing
+            pids = multiprocessing.SimpleQueue()
+            pool = ProcessPoolExecutor(self.workers, initializer=isolate, initargs=(pids,))
+        depth = max(1, int(log2(self.workers + 1)))
+        futures: dict[int, Future] = {}
+        merged: set[int] = set()
+
+        def prefetch(*ks: int):
+            for k in ks:
+                if k not in futures:
+                    futures[k] = pool.submit(solveKBatchTask, singleSolver, state, k, remaining())
+                    count("search.submitted")
 
         def solveKBatch(k: int):
-            stateK: ConnectionState = state.copy()
-            for config in stateK.pods.configs.values():
-                if config.redundancy != None:
-                    config.redundancy *= k
-            solution = singleSolver.solve(stateK)
+            with phase(f"search.k{k}"):
+                if pool is None:
+                    solution = singleSolver.solve(scaleRedundancy(state, k), remaining())
+                else:
+                    prefetch(k)
+                    ids, optimal, gap, bound, profile = futures[k].result()
+                    if k not in merged:
+                        merged.add(k)
+                        profiler.merge(profile)
+                    batch = Batch()
+                    batch.extend(state.pods[id] for id in ids)
+                    solution = Solution(state=state, optimal=optimal, gap=gap, bound=bound)
+                    solution.append(batch)
+            count("search.steps")
             assert len(solution.coveredConnection) <= totalWeak
             return solution
 
+        try:
+            return self.search(state, solveKBatch, remaining,
+                               (lambda l, r, *ks: prefetch(*ks, *searchTree(l, r, depth))) if pool else None)
+        finally:
+            if pool is not None:
+                # speculative solves that finished without being used still did the work
+                for k, future in futures.items():
+                    if k not in merged and future.done() and not future.cancelled() and future.exception() is None:
+                        profiler.merge(future.result()[-1])
+                if all(future.done() for future in futures.values()):
+                    pool.shutdown(cancel_futures=True)
+                else:
+                    count("search.abandoned", sum(not future.done() for future in futures.values()))
+                    stopPool(pool, pids)
+
+    def search(self, state: ConnectionState, solveKBatch, remaining, speculate, hint: int | None = None):
         batchL, batchR = 1, 1
         type2pods = state.pods.types
         for name, config in state.pods.configs.items():
@@ -94,29 +241,295 @@ class CIPMultipleBatchSolver(Solver):
             totalPods = len(type2pods[name])
             batchR = max(batchR, ceil(totalPods / config.redundancy))
         batchCount = batchR
-        targetSolution = solveKBatch(batchCount)
-        maxCovered = len(targetSolution.coveredConnection)
+        probes: list[int] = []
+        if hint is not None and self.C1 > self.C3 + self.C4:
+            # selecting a pod then always pays off, so the largest batch count covers every coverable connection;
+            # confirm the hinted count and the one below it instead of solving there first
+            targetSolution = None
+            maxCovered = coverable(state)
+            optimal = True
+            hint = min(max(hint, 1), batchR)
+            probes = [hint, hint - 1]
+        else:
+            if speculate:
+                speculate(batchL, batchR, batchCount)
+            targetSolution = solveKBatch(batchCount)
+            maxCovered = len(targetSolution.coveredConnection)
+
+            optimal = targetSolution.optimal
 
         while batchL <= batchR:
-            mid = (batchL + batchR) // 2
+            budget = remaining()
+            if budget is not None and budget <= 0:
+                # out of budget, keep the best batch count found so far
+                optimal = False
+                break
+            while probes and not batchL <= probes[0] <= batchR:
+                probes.pop(0)
+            mid = probes.pop(0) if probes else (batchL + batchR) // 2
+            if speculate:
+                speculate(batchL, batchR)
             solution = solveKBatch(mid)
+            optimal = optimal and solution.optimal
             if len(solution.coveredConnection) < maxCovered:
                 batchL = mid+1
             else:
-                assert len(solution.coveredConnection) == maxCovered
+                # a time-limited solve for the larger k may have covered less than the optimum
+                assert len(solution.coveredConnection) == maxCovered or not optimal
                 assert mid <= batchCount
+                maxCovered = len(solution.coveredConnection)
                 batchCount = mid
                 targetSolution = solution
                 batchR = mid-1
 
+        if targetSolution is None:
+            # limited solves below the largest batch count all fell short
+            targetSolution = solveKBatch(batchCount)
+            optimal = False
+            maxCovered = len(targetSolution.coveredConnection)
+
         assert len(targetSolution) == 1 and len(
             targetSolution.coveredConnection) == maxCovered, "Unexpected none solution."
 
-        finalSolution = Solution(state=state)
-        finalSolution.extend(self.splitBatch(state, targetSolution[0]))
-        assert len(finalSolution) == batchCount, \
+        finalSolution = Solution(state=state, optimal=optimal,
+                                 gap=targetSolution.gap, bound=targetSolution.bound)
+        if not targetSolution[0]:
+            # the penalties outweigh every connection a pod could cover, so no batch is best
+            return finalSolution
+        finalSolution.extend(self.partitionBatch(state, targetSolution[0], batchCount))
+        assert len(finalSolution) == batchCount or (not optimal and len(finalSolution) <= batchCount), \
             f"The batch count is not equal, {batchCount=}, {len(finalSolution)=}."
 
         assert finalSolution.valid()
 
         return finalSolution
+
+
+@dataclass
+class SweepPoint(Serializable):
+    C1: float = 1000.0
+    C3: float = 10.0
+    C4: float = 1.0
+    covered: int = 0
+    batches: list[list[str]] = field(default_factory=list)
+    majors: int = 0
+    pods: int = 0
+    optimal: bool = True
+    # not dominated by another point: covering at least as much with at most as many batches, majors and pods
+    pareto: bool = False
+
+    def dominates(self, other: "SweepPoint"):
+        mine = (self.covered, -len(self.batches), -self.majors, -self.pods)
+        theirs = (other.covered, -len(other.batches), -other.majors, -other.pods)
+        return mine != theirs and all(a >= b for a, b in zip(mine, theirs))
+
+
+@dataclass
+class CIPWeightSweep:
+    # solves the batch search for every weight setting on one compiled model,
+    # changing only the weight and redundancy parameters and warm-starting from the previous incumbent
+    weights: list[tuple[float, float, float]] = field(default_factory=lambda: [(1000.0, 10.0, 1.0)])
+    timeLimit: float | None = None
+    gap: float | None = None
+    partition: str = "greedy"
+
+    def solve(self, state: ConnectionState) -> list[SweepPoint]:
+        points: list[SweepPoint] = []
+        if not state.pairs:
+            return [SweepPoint(C1, C3, C4, pareto=True) for C1, C3, C4 in self.weights]
+        from ..algorithms.cip import CIPSolver
+        cip = CIPSolver(state).compile(*self.weights[0], mutable=True)
+
+        def solveKBatch(k: int):
+            with phase(f"search.k{k}"):
+                cip.reweight(scale=k)
+                pods = cip.solve(self.timeLimit, self.gap)
+                batch = Batch()
+                batch.extend(pods)
+                solution = Solution(state=state, optimal=cip.optimal, gap=cip.gap, bound=cip.bound)
+                solution.append(batch)
+            count("search.steps")
+            return solution
+
+        for C1, C3, C4 in self.weights:
+            with phase("sweep.point"):
+                cip.reweight(C1, C3, C4)
+                solver = CIPMultipleBatchSolver(C1=C1, C3=C3, C4=C4, timeLimit=self.timeLimit, gap=self.gap,
+                                                partition=self.partition)
+                solution = solver.search(state, solveKBatch, lambda: None, None)
+            covered, batches, majors, pods = solution.evaluated
+            points.append(SweepPoint(C1, C3, C4, covered, [[p.id for p in batch] for batch in solution],
+                                     majors, pods, solution.optimal))
+        for point in points:
+            point.pareto = not any(other.dominates(point) for other in points)
+        return points
+
+
+@dataclass
+class SolveSession:
+    # keeps one model for an evolving state: deltas patch its connection terms, pod variables and
+    # redundancy constraints, and every solve starts from the variable values of the previous one
+    state: ConnectionState
+    C1: float = 1000.0
+    C3: float = 10.0
+    C4: float = 1.0
+    timeLimit: float | None = None
+    gap: float | None = None
+    partition: str = "greedy"
+    solution: Solution | None = field(default=None, init=False)
+    model: "pyo.ConcreteModel" = field(default=None, init=False)
+    # variable index of every pod ever seen, and the slot in model.cover of every stored connection;
+    # slots of removed connections are zeroed and reused, so the running sums only ever grow by new slots
+    id2int: dict[str, int] = field(default_factory=dict, init=False)
+    slots: dict[tuple[str, str], int] = field(default_factory=dict, init=False)
+    free: list[int] = field(default_factory=list, init=False)
+    covered: object = field(default=0, init=False)
+    spent: object = field(default=0, init=False)
+    dirty: bool = field(default=True, init=False)
+
+    def __post_init__(self):
+        import pyomo.environ as pyo
+        self.state = self.state.copy()
+        with phase("compile"):
+            model = self.model = pyo.ConcreteModel()
+            model.K = pyo.Param(mutable=True, initialize=1)
+            model.x = pyo.Var(pyo.Any, dense=False, domain=pyo.Binary)
+            model.OBJ = pyo.Objective(expr=0, sense=pyo.maximize)
+            model.cons = pyo.Constraint(pyo.Any)
+            model.cover = pyo.Expression(pyo.Any)
+            model.cost = pyo.Expression(pyo.Any)
+            for id, pod in self.state.pods.items():
+                self.var(id).value = 0
+                self.price(pod)
+            for source, target in self.state.pairs:
+                self.term(source, target)
+            for name in self.state.pods.types:
+                self.constrain(name)
+
+    def var(self, id: str):
+        i = self.id2int.get(id)
+        if i is None:
+            i = self.id2int[id] = len(self.id2int)
+        return self.model.x[i]
+
+    def term(self, source: str, target: str):
+        x, y = self.var(source), self.var(target)
+        expr = 1 - (1 - x) * (1 - y)
+        if self.free:
+            slot = self.free.pop()
+            self.model.cover[slot].set_value(expr)
+        else:
+            slot = len(self.model.cover)
+            self.model.cover[slot] = expr
+            self.covered = self.covered + self.model.cover[slot]
+        self.slots[(source, target)] = slot
+        count("compile.terms")
+
+    def price(self, pod: Pod):
+        # the cost of using a pod, kept in the running sum for good: a removed pod has its variable fixed to 0
+        i = self.id2int[pod.id]
+        if i in self.model.cost:
+            return
+        weight = self.C4 + (self.C3 if pod.name in self.state.pods.majorTypes else 0.0)
+        self.model.cost[i] = weight * self.model.x[i]
+        self.spent = self.spent + self.model.cost[i]
+        count("compile.terms")
+
+    def constrain(self, name: str):
+        redundancy = self.state.pods.configs[name].redundancy
+        if redundancy is None:
+            if name in self.model.cons:
+                del self.model.cons[name]
+            return
+        pods = self.state.pods.types[name]
+        if not pods:
+            if name in self.model.cons:
+                del self.model.cons[name]
+            return
+        self.model.cons[name] = sum(self.var(p.id) for p in pods) <= redundancy * self.model.K
+
+    def detach(self):
+        # the last returned solution keeps the state it was solved for, and the session goes on with a copy
+        if self.solution is not None and self.solution.state is self.state:
+            self.state = self.state.copy()
+
+    def addPods(self, *pods: Pod):
+        self.detach()
+        self.state.pods.pod(*pods)
+        for pod in pods:
+            x = self.var(pod.id)
+            x.unfix()
+            x.value = 0
+            self.price(pod)
+        for name in {pod.name for pod in pods}:
+            self.constrain(name)
+        self.dirty = True
+
+    def removePods(self, *ids: str):
+        # their connections go with them; the variables stay fixed to 0 until the pods come back
+        self.detach()
+        for id in ids:
+            for source, target in [self.state.index.pairs[e] for e in self.state.index.incident(id).tolist()]:
+                self.remove((source, target))
+        names = {self.state.pods[id].name for id in ids}
+        for id in ids:
+            del self.state.pods[id]
+            self.var(id).fix(0)
+        for name in names:
+            self.constrain(name)
+        self.dirty = True
+
+    def add(self, *pairs: tuple[str, str]):
+        self.detach()
+        for source, target in pairs:
+            if not self.state.hasWeak(source, target):
+                self.state.weak(source, target)
+                self.term(source, target)
+        self.dirty = True
+
+    def remove(self, *pairs: tuple[str, str]):
+        self.detach()
+        for source, target in pairs:
+            slot = self.slots.pop((source, target), None)
+            if slot is not None:
+                self.state.unweak(source, target)
+                self.model.cover[slot].set_value(0)
+                self.free.append(slot)
+                count("compile.terms")
+        self.dirty = True
+
+    def compile(self):
+        if not self.dirty:
+            return
+        with phase("compile"):
+            # the term and cost expressions are patched by the deltas, only their weighted sum is put together here
+            self.model.OBJ.expr = self.C1 * self.covered - self.spent
+        peak("model.vars", len(self.state.pods))
+        peak("model.edges", len(self.slots))
+        self.dirty = False
+
+    def solveKBatch(self, k: int):
+        import pyomo.environ as pyo
+        from ..algorithms.cip import runScip
+        with phase(f"search.k{k}"):
+            self.model.K.set_value(k)
+            loaded, optimal, gap, bound = runScip(self.model, self.timeLimit, self.gap)
+            batch = Batch()
+            if loaded:
+                batch.extend(pod for id, pod in self.state.pods.items()
+                             if abs((pyo.value(self.var(id), exception=False) or 0.0) - 1.0) < 0.1)
+            solution = Solution(state=self.state, optimal=optimal, gap=gap, bound=bound)
+            solution.append(batch)
+        count("search.steps")
+        return solution
+
+    def solve(self) -> Solution:
+        if not self.state.pairs:
+            self.solution = Solution(self.state)
+            return self.solution
+        self.compile()
+        solver = CIPMultipleBatchSolver(C1=self.C1, C3=self.C3, C4=self.C4, timeLimit=self.timeLimit, gap=self.gap,
+                                        partition=self.partition)
+        hint = None if self.solution is None else len(self.solution)
+        self.solution = solver.search(self.state, self.solveKBatch, lambda: None, None, hint)
+        return self.solution
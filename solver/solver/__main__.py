@@ -1,19 +1,43 @@
 from pathlib import Path
-import sys
 import json
 
-if __name__ == "__main__":
-    assert len(sys.argv) == 2, "Must have a file argument."
-    file = Path(sys.argv[1])
-    assert file.is_file(), "Must have a file argument."
-    
+import click
+
+
+@click.command()
+@click.argument("file", type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path))
+@click.option("--time-limit", default=None, type=float, help="Time limit in seconds for each SCIP solve.")
+@click.option("--gap", default=None, type=float, help="Relative MIP gap to stop each SCIP solve at.")
+@click.option("--deadline", default=None, type=float, help="Time budget in seconds for the whole batch search.")
+@click.option("--workers", default=1, type=int, help="Solve upcoming batch-search steps in parallel.")
+@click.option("--partition", default="greedy", type=click.Choice(["greedy", "balanced", "exact"]),
+              help="Split the selected pods type by type (greedy), or opt in to balanced or exact batches.")
+@click.option("--presolve/--no-presolve", default=False, help="Reduce the model before each SCIP solve (opt-in).")
+@click.option("--jsonl", is_flag=True, help="Write the solution as JSON Lines records.")
+def main(file: Path, time_limit: float | None, gap: float | None, deadline: float | None, workers: int, partition: str,
+         presolve: bool, jsonl: bool):
+    from ..model import stream
     from ..model.connection import ConnectionState
-    state = ConnectionState()
-    state.load(json.loads(file.read_text()))
+    if file.suffix == ".jsonl":
+        with file.open() as f:
+            state = stream.load(stream.read(f))
+    else:
+        state = ConnectionState()
+        state.load(json.loads(file.read_text()))
 
     from . import CIPMultipleBatchSolver
-    solver = CIPMultipleBatchSolver()
+    solver = CIPMultipleBatchSolver(timeLimit=time_limit, gap=gap, deadline=deadline, workers=workers,
+                                   partition=partition, presolve=presolve)
 
+    from ..profiling import profiler
     solution = solver.solve(state)
-    
-    print(json.dumps(solution.dump()))
+    profiler.annotate(solution.status)
+
+    if jsonl:
+        stream.write(stream.solutionRecords(solution))
+    else:
+        print(json.dumps(solution.dump()))
+
+
+if __name__ == "__main__":
+    main()
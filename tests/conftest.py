@@ -0,0 +1,34 @@
+import shutil
+import pytest
+from solver.model.connection import ConnectionState
+from solver.model.pod import Pod, PodConfig, PodContainer
+
+
+@pytest.fixture
+def scip():
+    if shutil.which("scip") is None:
+        pytest.skip("SCIP is not installed")
+
+
+@pytest.fixture
+def state():
+    # the connections of example2
+    pods = PodContainer()
+    pods.pod(*Pod.fromRange("sm2", range(4)))
+    pods.configs["sm2"] = PodConfig(3)
+    pods.pod(*Pod.fromRange("nsim", range(3)))
+    pods.configs["nsim"] = PodConfig(1, True)
+    pods.pod(*Pod.fromRange("sbim", range(3)))
+    pods.configs["sbim"] = PodConfig(1, True)
+    pods.pod(*Pod.fromRange("csdb", range(2)))
+    pods.configs["csdb"] = PodConfig(1)
+    pods.pod(*Pod.fromRange("cslb", range(2)))
+    pods.configs["cslb"] = PodConfig(1)
+    pods.connect("sm2", "csdb", "sbim", "nsim")
+    pods.connect("cslb", "sbim", "nsim")
+    state = ConnectionState(pods)
+    state.weaks(("sm2-0", "sbim-1"), ("sm2-0", "sbim-2"), ("sm2-0", "nsim-1"), ("sm2-0", "nsim-2"),
+                ("sm2-0", "csdb-0"), ("sm2-0", "csdb-1"), ("cslb-0", "sbim-0"), ("cslb-0", "nsim-0"),
+                ("cslb-1", "sbim-0"), ("cslb-1", "nsim-0"), ("sm2-1", "sbim-0"), ("sm2-1", "nsim-0"),
+                ("sm2-2", "sbim-0"), ("sm2-2", "nsim-0"), ("sm2-3", "sbim-0"), ("sm2-3", "nsim-0"))
+    return state
@@ -0,0 +1,38 @@
+from typing import TYPE_CHECKING
+from itertools import chain
+import random
+
+if TYPE_CHECKING:
+    from solver.model.connection import ConnectionState
+    from solver.model.fabric import Fabric
+    from solver.model.pod import Pod, PodConfig, PodContainer
+    from solver.generator import ProbabilityConnectionStateGenerator
+
+    def submit(state: ConnectionState): pass
+
+pods = PodContainer()
+
+pods.pod(*Pod.fromRange("sm2", range(72 * 4)))
+pods.configs["sm2"] = PodConfig(3)
+pods.pod(*Pod.fromRange("nsim", range(6 * 4)))
+pods.configs["nsim"] = PodConfig(1, True)
+pods.pod(*Pod.fromRange("sbim", range(20 * 4)))
+pods.configs["sbim"] = PodConfig(1, True)
+pods.pod(*Pod.fromRange("csdb", range(26 * 4)))
+pods.configs["csdb"] = PodConfig(1)
+pods.pod(*Pod.fromRange("cslb", range(8 * 4)))
+pods.configs["cslb"] = PodConfig(1)
+pods.connect("sm2", "csdb", "sbim", "nsim")
+pods.connect("cslb", "sbim", "nsim")
+
+# 4 spines, 1000 leaves in dual-homed pairs, 2 hosts per pair
+fabric = Fabric(eors=4, tors=1000, hostsPerGroup=2, homing=2, uplinks=2)
+net = fabric.network(pods)
+frenet = net.freeze()
+
+fail = random.choices(list(chain.from_iterable(tor.inames() for tor in fabric.tor)), k=2)
+frenet.off(*fail)
+
+gen = ProbabilityConnectionStateGenerator.fromNetwork(frenet)
+state = gen.generate()
+submit(state)
@@ -0,0 +1,31 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from solver.model.connection import ConnectionState
+    from solver.model.network import Network, NetworkTopo, FreezedNetwork
+    from solver.model.pod import Pod, PodConfig, PodContainer
+    from solver.model.solution import Solution, Batch
+    from solver.generator import RandomConnectionStateGenerator, ProbabilityConnectionStateGenerator, BulkConnectionStateGenerator
+
+    def submit(state: ConnectionState): pass
+
+pods = PodContainer()
+
+pods.pod(*Pod.fromRange("sm2", range(5400)))
+pods.configs["sm2"] = PodConfig(3)
+pods.pod(*Pod.fromRange("nsim", range(450)))
+pods.configs["nsim"] = PodConfig(1, True)
+pods.pod(*Pod.fromRange("sbim", range(1500)))
+pods.configs["sbim"] = PodConfig(1, True)
+pods.pod(*Pod.fromRange("csdb", range(1950)))
+pods.configs["csdb"] = PodConfig(1)
+pods.pod(*Pod.fromRange("cslb", range(600)))
+pods.configs["cslb"] = PodConfig(1)
+pods.connect("sm2", "csdb", "sbim", "nsim")
+pods.connect("cslb", "sbim", "nsim")
+
+state = ConnectionState(pods)
+
+BulkConnectionStateGenerator(seed=0).state(state, 1000000)
+
+submit(state)
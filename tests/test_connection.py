@@ -0,0 +1,19 @@
+from solver.model.connection import EdgeIndex
+
+
+def test_unweak_updates_the_index_in_place(state):
+    edges = state.edges
+    state.unweak("sm2-0", "sbim-1", "csdb-1", "cslb-0")
+    state.unweak("cslb-1", "sbim-0", "nsim-0")
+    state.unweak("sm2-3", "nsim-0")
+    state.weak("sm2-3", "csdb-0")
+    # the index was patched rather than dropped, and agrees with one built from the target lists
+    assert state.edges is edges
+    rebuilt = EdgeIndex.fromState(state)
+    assert set(edges) == set(rebuilt) == {(s, t) for s, targets in state.items() for t in targets}
+    assert len(edges) == len(rebuilt) == 12
+    assert ("sm2-0", "sbim-1") not in edges and ("sm2-3", "csdb-0") in edges
+    assert "cslb-1" not in state
+    assert all(edges.degree(id) == rebuilt.degree(id) for id in state.pods)
+    assert all(edges[edges.positions[s << 32 | t]] == (edges.ids[s], edges.ids[t])
+               for s, t in zip(edges.sources, edges.targets))
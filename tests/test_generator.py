@@ -0,0 +1,33 @@
+from solver.generator import BulkConnectionStateGenerator
+from solver.model.connection import ConnectionState
+from solver.model.pod import Pod, PodContainer
+
+
+def twoTypes(n: int):
+    pods = PodContainer()
+    pods.pod(*Pod.fromRange("a", range(n)))
+    pods.pod(*Pod.fromRange("b", range(n)))
+    pods.connect("a", "b")
+    return ConnectionState(pods)
+
+
+def test_bulk_fills_every_allowed_pair():
+    # both directions of every a-b pod pair, asked for more than exist
+    state = BulkConnectionStateGenerator(seed=1).state(twoTypes(150), 10 ** 6)
+    assert len(state.pairs) == len(set(state.pairs)) == 2 * 150 * 150
+    assert all(x[0] != y[0] for x, y in state.pairs)
+
+
+def test_bulk_near_saturation_keeps_existing_connections():
+    state = twoTypes(40)
+    state.weak("a-0", "b-0")
+    state.weak("b-1", "a-1")
+    BulkConnectionStateGenerator(seed=2).state(state, 2 * 40 * 40 - 3)
+    assert len(state.pairs) == len(set(state.pairs)) == 2 * 40 * 40 - 3
+    assert ("a-0", "b-0") in state.pairs and ("b-1", "a-1") in state.pairs
+
+
+def test_bulk_is_reproducible():
+    first = list(BulkConnectionStateGenerator(seed=3).state(twoTypes(60), 6000).pairs)
+    second = list(BulkConnectionStateGenerator(seed=3).state(twoTypes(60), 6000).pairs)
+    assert first == second
@@ -0,0 +1,30 @@
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from solver.bench import IMPORT_BUDGETS
+
+HEAVY = ("numpy", "pyomo", "rich.console")
+
+
+def test_fast_modules_leave_heavy_dependencies_unloaded():
+    # import times are checked by `bench`; here only that nothing heavy sneaks back into the import graph
+    for module in IMPORT_BUDGETS:
+        loaded = subprocess.run([sys.executable, "-c", f"import sys, {module}; print(*(m for m in {HEAVY!r} if m in sys.modules))"],
+                                capture_output=True, text=True, check=True, cwd=Path(__file__).parent.parent).stdout.split()
+        assert not loaded, f"{module} loads {', '.join(loaded)}"
+
+
+def test_viewer_starts_fast(state, tmp_path):
+    # the fastest of some runs of the whole command, against the 100 ms budget of an interactive viewer
+    file = tmp_path / "state.json"
+    file.write_text(json.dumps(state.dump()))
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-m", "solver", "state", str(file)], capture_output=True, text=True,
+                                check=True, cwd=Path(__file__).parent.parent).stdout
+        best = min(best, time.perf_counter() - start)
+    assert "14 Pods (in 5 types):" in output and "16 Weak Connections:" in output
+    assert best < 0.1, f"state viewer took {best * 1000:.0f} ms"
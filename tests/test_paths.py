@@ -0,0 +1,83 @@
+import random
+from itertools import islice
+from solver.algorithms.path import ShortestPathCollector
+from solver.generator import ProbabilityConnectionStateGenerator
+from solver.model.fabric import Fabric
+from solver.model.pod import Pod, PodConfig, PodContainer
+
+
+def network(failures: int = 3, seed: int = 0):
+    random.seed(seed)
+    pods = PodContainer()
+    pods.pod(*Pod.fromRange("sm2", range(12)))
+    pods.configs["sm2"] = PodConfig(3)
+    pods.pod(*Pod.fromRange("nsim", range(4)))
+    pods.configs["nsim"] = PodConfig(1, True)
+    pods.pod(*Pod.fromRange("csdb", range(6)))
+    pods.connect("sm2", "csdb", "nsim")
+    fabric = Fabric(eors=2, tors=4, hostsPerGroup=3, homing=2, uplinks=2)
+    net = fabric.network(pods)
+    ports = [port for tor in fabric.tor for port in tor.inames()]
+    return net, random.sample(ports, failures)
+
+
+def test_k_paths_cheapest_group_is_the_shortest_paths():
+    net, failed = network()
+    frenet = net.freeze()
+    frenet.off(*failed)
+    for s, t in islice(frenet.connectedPairs(), 40):
+        paths = frenet.kPaths(s, t, 64)
+        costs = [path.cost for path in paths]
+        assert costs == sorted(costs)
+        assert all(len(set(path)) == len(path) for path in paths)
+        # unit weights: the cheapest group is exactly the set of shortest paths
+        cheapest = {tuple(path) for path in paths if path.cost == costs[0]}
+        assert cheapest == {tuple(path) for path in frenet.iterState(s, t)}
+
+
+def test_csr_paths_match_the_reference_search():
+    net, failed = network()
+    frenet = net.freeze()
+    frenet.off(*failed)
+    # the dict-based search over the same graph
+    reference = ShortestPathCollector()
+    reference.node(*range(frenet.graph.size))
+    for u, vs in enumerate(frenet.graph.lists):
+        reference.edge(u, *vs)
+    for s, t in islice(frenet.connectedPairs(), 60):
+        sInt, tInt = frenet.id2int[s], frenet.id2int[t]
+        expected = {tuple(p) for p in reference.shortestPaths(sInt, frenet.podInts, set(frenet.sameTypes[sInt]))[tInt]}
+        healthy, weak = frenet.state(s, t)
+        assert {tuple(p) for p in healthy + weak} == expected
+        assert frenet.stateCount(s, t) == (len(healthy), len(weak))
+        assert {tuple(p) for p in frenet.iterState(s, t, weak=False)} == {tuple(p) for p in healthy}
+        assert {tuple(p) for p in frenet.iterState(s, t, weak=True)} == {tuple(p) for p in weak}
+
+
+def test_bounded_tables_match_the_eager_ones():
+    net, failed = network()
+    eager, bounded = net.freeze(), net.freeze(budget=1)
+    for frenet in (eager, bounded):
+        frenet.off(*failed)
+    for s, t in islice(eager.connectedPairs(), 60):
+        assert bounded.stateCount(s, t) == eager.stateCount(s, t)
+        assert [list(p) for p in bounded.iterState(s, t)] == [list(p) for p in eager.iterState(s, t)]
+    # a budget below one table keeps only the last one, so nearly every lookup rebuilds
+    assert len(bounded.cache.tables) == 1 and bounded.cache.evictions > 0
+    assert (ProbabilityConnectionStateGenerator.fromNetwork(bounded).probabilities ==
+            ProbabilityConnectionStateGenerator.fromNetwork(eager).probabilities)
+    roomy = net.freeze(budget=1 << 30)
+    roomy.off(*failed)
+    assert (ProbabilityConnectionStateGenerator.fromNetwork(roomy).probabilities ==
+            ProbabilityConnectionStateGenerator.fromNetwork(eager).probabilities)
+    assert roomy.cache.evictions == 0 and roomy.cache.hits > 0
+
+
+def test_fabric_downlinks_can_share_the_uplink_ports():
+    # the hand-built layout of exp.py: tor ports 0 and 1 also cable the hosts of the group
+    fabric = Fabric(eors=2, tors=4, hostsPerGroup=2, homing=2, uplinks=2, downlinkPort=0)
+    cables = {tuple(sorted((s, t))) for s, ts in fabric.topo().cables.items() for t in ts}
+    assert {("eor-0:0", "tor-0:0"), ("host-0:0", "tor-0:0"), ("host-1:1", "tor-1:1")} <= cables
+    assert not any("tor-0:4" in cable for cable in cables)
+    default = {tuple(sorted((s, t))) for s, ts in Fabric(eors=2, tors=4).topo().cables.items() for t in ts}
+    assert ("host-0:0", "tor-0:4") in default and len(default) == len(cables)
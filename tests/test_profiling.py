@@ -0,0 +1,29 @@
+from solver.profiling import Profiler, profiler
+from solver.solver import CIPMultipleBatchSolver
+
+
+def test_merge_sums_counts_and_keeps_peaks():
+    worker = Profiler()
+    worker.count("scip.solves", 2)
+    worker.peak("model.vars", 10)
+    with worker.phase("solve"):
+        pass
+    main = Profiler()
+    main.count("scip.solves")
+    main.peak("model.vars", 20)
+    main.merge(worker.snapshot())
+    main.merge(worker.snapshot())
+    assert main.counters["scip.solves"] == 5
+    assert main.counters["model.vars"] == 20
+    assert main.phases["solve"] == 2 * worker.phases["solve"]
+
+
+def test_worker_profiles_are_merged(scip, state):
+    profiler.reset()
+    CIPMultipleBatchSolver(workers=1).solve(state)
+    serial = dict(profiler.counters)
+    profiler.reset()
+    CIPMultipleBatchSolver(workers=2).solve(state)
+    assert profiler.counters["scip.solves"] >= serial["scip.solves"] > 0
+    assert profiler.counters["model.constraints"] == serial["model.constraints"]
+    assert "compile" in profiler.phases and "solve" in profiler.phases
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import multiprocessing
+import time
+from dataclasses import dataclass
+from pathlib import Path
+import batch
+from solver.model import ExecutionStatus
+from solver.model.solution import Solution
+from solver.pipeline import Pipeline, StageError
+from solver.queue import JobQueue, Worker, collect
+
+
+@dataclass
+class FakePipeline(Pipeline):
+    # stages write a solution whose metrics follow from the case index instead of running `python -m solver`;
+    # cases in `failing` fail every attempt, and every solve stage is logged to `runs`
+    failing: tuple[int, ...] = ()
+    runs: Path | None = None
+
+    async def stage(self, semaphore: asyncio.Semaphore, timeout: float, target: Path, *args: str):
+        async with semaphore:
+            await asyncio.sleep(0.01)
+        if args[0] == "generate":
+            target.write_text("{}")
+            return
+        index = int(target.name.split("_")[0])
+        if index in self.failing:
+            raise StageError(f"case {index} fails")
+        if self.runs is not None:
+            with self.runs.open("a") as f:
+                f.write(f"{target.parent.name} {index}\n")
+        solution = Solution()
+        solution.status = ExecutionStatus(cpuPercent=100, wallClock=index / 4, maxResidentSize=1024 * index,
+                                          phases={"solve": index / 8}, counters={"search.steps": index})
+        target.write_text(json.dumps(solution.dump()))
+
+
+def work(path: Path, root: Path, failing: tuple[int, ...] = ()):
+    pipeline = FakePipeline(concurrency=2, root=root, failing=failing, runs=root / "runs.log")
+    asyncio.run(Worker(JobQueue(path), pipeline).run())
+
+
+def workers(path: Path, root: Path, count: int, failing: tuple[int, ...] = ()):
+    processes = [multiprocessing.Process(target=work, args=(path, root, failing)) for _ in range(count)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+
+def rows(queue: JobQueue):
+    with queue.transaction() as db:
+        return db.execute("SELECT name, idx, state, attempts, worker FROM jobs ORDER BY name, idx").fetchall()
+
+
+def test_workers_complete_every_job_once(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.init()
+    assert queue.enqueue("a", 12, seed=0) == 12
+    assert queue.enqueue("b", 6) == 6
+    assert queue.enqueue("a", 12) == 0
+    workers(queue.path, tmp_path / "logs", 3)
+    runs = (tmp_path / "logs" / "runs.log").read_text().split("\n")[:-1]
+    assert sorted(runs) == sorted([f"a {i}" for i in range(1, 13)] + [f"b {i}" for i in range(1, 7)])
+    assert queue.counts() == {"a": {"done": 12}, "b": {"done": 6}}
+    assert all(state == "done" and attempts == 1 for _, _, state, attempts, _ in rows(queue))
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", lease=0.05, attempts=2)
+    queue.init()
+    queue.enqueue("a", 1)
+    first = queue.claim("w1")
+    assert first.attempts == 1 and queue.claim("w2") is None
+    time.sleep(0.1)
+    second = queue.claim("w2")
+    assert (second.name, second.index, second.attempts) == ("a", 1, 2)
+    # the first claim is gone, so its worker can neither renew nor settle the job
+    assert not queue.renew(first) and not queue.fail(first, "late")
+    assert queue.renew(second)
+    time.sleep(0.1)
+    # the lease ran out on the last attempt
+    assert queue.claim("w3") is None
+    assert rows(queue) == [("a", 1, "failed", 2, "w2")]
+    assert [result.error for result in queue.results("a")] == ["lease expired"]
+
+
+def test_failed_job_is_retried_until_attempts_run_out(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", attempts=2)
+    queue.init()
+    queue.enqueue("a", 1)
+    job = queue.claim("w1")
+    assert queue.fail(job, "boom")
+    assert queue.counts() == {"a": {"pending": 1}}
+    job = queue.claim("w2")
+    assert job.attempts == 2
+    assert queue.fail(job, "boom again")
+    assert queue.counts() == {"a": {"failed": 1}} and queue.claim("w3") is None
+    assert [(result.attempts, result.error) for result in queue.results("a")] == [(2, "boom again")]
+    queue.reset()
+    assert queue.claim("w4").attempts == 1
+
+
+def test_collect_matches_the_single_machine_summary(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    batch.multiple("a", 8, pipeline=FakePipeline(concurrency=2, failing=(3,)))
+    single = json.loads((tmp_path / "logs" / "a" / "result.json").read_text())
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.init()
+    queue.enqueue("a", 8)
+    workers(queue.path, tmp_path / "queued", 2, failing=(3,))
+    assert queue.counts() == {"a": {"done": 7, "failed": 1}}
+    collect(queue, tmp_path / "queued")
+    assert json.loads((tmp_path / "queued" / "a" / "result.json").read_text()) == single
+    assert single["failed"] == 1 and single["counters"] == {"search.steps": 33 / 7}
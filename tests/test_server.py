@@ -0,0 +1,38 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from solver.server import SolveService, bind
+
+
+@pytest.fixture
+def url():
+    service = SolveService(workers=1).start()
+    server = bind(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    service.stop()
+
+
+def post(url: str, body: bytes):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=body, method="POST")) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as ex:
+        return ex.code, json.loads(ex.read())
+
+
+def test_client_errors(url):
+    for path, body in [("/solve", b"null"), ("/solve", b"[1]"), ("/solve", b"{"), ("/solve", b'{"pods": 1}'),
+                       ("/solve/batch", b"{}"), ("/solve/batch", b"[null]"), ("/networks/x", b"3")]:
+        code, _ = post(url + path, body)
+        assert code == 400, (path, body)
+    code, data = post(url + "/networks/missing/state", b"")
+    assert code == 404 and "missing" in data["error"]
+    with urllib.request.urlopen(url + "/metrics") as response:
+        metrics = json.loads(response.read())
+    assert metrics["failed"] == 0 and metrics["invalid"] == 7
@@ -0,0 +1,98 @@
+import random
+from solver.algorithms.cip import CIPSolver
+from solver.algorithms.evaluate import CoverageEvaluator
+from solver.generator import BulkConnectionStateGenerator, RandomConnectionStateGenerator
+from solver.model.connection import ConnectionState
+from solver.model.pod import Pod, PodContainer
+from solver.model.solution import Batch
+from solver.profiling import profiler
+from solver.solver import CIPMultipleBatchSolver, CIPSingleBatchSolver, CIPWeightSweep, SolveSession
+
+
+def randomState(seed: int, podCount: int = 40, weaks: int = 50):
+    random.seed(seed)
+    pods = PodContainer()
+    RandomConnectionStateGenerator().pods(pods, podCount, 4, 0.5)
+    pods.connectAll(*pods.types)
+    state = ConnectionState(pods)
+    return BulkConnectionStateGenerator(seed).state(state, weaks)
+
+
+def objective(solution, C1=1000.0, C3=10.0, C4=1.0):
+    covered, _, majors, pods = solution.evaluated
+    return C1 * covered - C3 * majors - C4 * pods
+
+
+def test_presolve_matches_the_plain_model(scip, state):
+    # sparse states, where isolated and interchangeable pods leave the presolve something to reduce
+    for s in [state] + [randomState(seed, 60, 25) for seed in range(4)]:
+        assert CIPSolver(s).compile(presolve=True).presolved is not None
+        plain = CIPSingleBatchSolver(presolve=False).solve(s)
+        reduced = CIPSingleBatchSolver(presolve=True).solve(s)
+        assert objective(reduced) == objective(plain)
+        plain = CIPMultipleBatchSolver(presolve=False).solve(s)
+        reduced = CIPMultipleBatchSolver(presolve=True).solve(s)
+        assert reduced.valid() and reduced.evaluated[:2] == plain.evaluated[:2]
+
+
+def test_sweep_records_corners_that_select_nothing(scip, state):
+    # covering a connection is worth less than selecting any pod at the first two settings
+    points = CIPWeightSweep([(0.5, 10.0, 10.0), (1.0, 500.0, 10.0), (1000.0, 10.0, 1.0)]).solve(state)
+    for point in points[:2]:
+        assert (point.covered, point.batches, point.majors, point.pods) == (0, [], 0, 0)
+    assert points[2].covered == len(state.pairs) and points[2].batches
+    assert all(point.pareto for point in points)
+    solution = CIPMultipleBatchSolver(C1=0.5, C4=10.0).solve(state)
+    assert len(solution) == 0 and solution.evaluated == (0, 0, 0, 0)
+
+
+def test_session_matches_cold_solves(scip, state):
+    session = SolveSession(state)
+    first = session.solve()
+    before = first.evaluated
+    assert before[:2] == CIPMultipleBatchSolver().solve(state).evaluated[:2]
+    deltas = [lambda: session.removePods("sbim-0", "nsim-0"),
+              lambda: session.remove(("sm2-0", "csdb-0"), ("sm2-0", "csdb-1")),
+              lambda: session.addPods(Pod("csdb", 2)),
+              lambda: session.add(("sm2-1", "csdb-2"), ("sm2-2", "csdb-2"), ("cslb-0", "sbim-1"))]
+    for delta in deltas:
+        delta()
+        solution = session.solve()
+        assert solution.valid()
+        assert solution.evaluated[:2] == CIPMultipleBatchSolver().solve(session.state.copy()).evaluated[:2]
+    # returned solutions keep the state they were solved for
+    assert first.evaluated == before and "sbim-0" in first.state.pods
+
+
+def test_session_delta_compiles_less_than_a_cold_session(scip):
+    state = randomState(0, weaks=200)
+    profiler.reset()
+    session = SolveSession(state)
+    session.solve()
+    cold = profiler.counters["compile.terms"]
+    assert cold == len(state.pairs) + len(state.pods)
+    pairs = list(state.pairs)[:2]
+    profiler.reset()
+    session.remove(*pairs)
+    session.add(*pairs[:1])
+    solution = session.solve()
+    # two zeroed slots and one of them reused, against every term and pod cost of the cold model
+    assert profiler.counters["compile.terms"] == 3
+    assert solution.evaluated[:2] == CIPMultipleBatchSolver().solve(session.state.copy()).evaluated[:2]
+
+
+def test_parallel_search_matches_the_sequential_one(scip, state):
+    for s in [state] + [randomState(seed) for seed in range(3)]:
+        sequential = CIPMultipleBatchSolver(workers=1).solve(s)
+        parallel = CIPMultipleBatchSolver(workers=3).solve(s)
+        assert len(parallel) == len(sequential)
+        covered = CoverageEvaluator(s).solutions([list(sequential), list(parallel)])[:, 0]
+        assert covered[0] == covered[1]
+
+
+def test_default_partition_is_the_greedy_split(scip, state):
+    solver = CIPMultipleBatchSolver()
+    solution = solver.solve(state)
+    selected = Batch()
+    selected.extend(pod for batch in solution for pod in batch)
+    assert [list(batch) for batch in solution] == [list(batch) for batch in solver.splitBatch(state, selected)]